@@ -1,14 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import json, os
-import inspect
 from . import dreamnodes
 from .conf import DPaint_Config
+from .core import STAMP_CACHE, RESULT_CACHE, BitCanvas, PROFILER, profile_node
 
-_NODE_CLASSES = []
-for name, cls in inspect.getmembers(dreamnodes, inspect.isclass):
-    if hasattr(cls,"NODE_NAME"):
-        _NODE_CLASSES.append(cls)
+_NODE_CLASSES = dreamnodes.NODE_CLASSES
 
 _SIGNATURE_SUFFIX = " [DPaint]"
 
@@ -25,6 +22,16 @@ NODE_CLASS_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS = {}
 
 config = DPaint_Config()
+STAMP_CACHE.max_bytes = int(config.get("render.stamp_cache_megabytes", 64)) * 1024 * 1024
+# Zero threads means one per CPU core.
+BitCanvas.RENDER_THREADS = int(config.get("render.threads", 1)) or os.cpu_count() or 1
+# Zero megabytes turns the result cache off.
+RESULT_CACHE.max_bytes = int(config.get("cache.result_cache_megabytes", 1024)) * 1024 * 1024
+# DPAINT_PROFILE=1 turns profiling on, DPAINT_PROFILE=memory also tracks allocations.
+_PROFILE_ENV = os.environ.get("DPAINT_PROFILE", "").strip().lower()
+PROFILER.configure(config.get("profiling.enabled", False) or _PROFILE_ENV not in ("", "0", "false", "no"),
+                   config.get("profiling.track_allocations", False) or _PROFILE_ENV == "memory",
+                   config.get("profiling.report_file", ""))
 
 
 def update_category(cls):
@@ -61,6 +68,8 @@ for cls in _NODE_CLASSES:
     clsname = cls.__name__
     if "NODE_NAME" in cls.__dict__:
         node_name = cls.__dict__["NODE_NAME"] + _SIGNATURE_SUFFIX
+        if PROFILER.enabled:
+            profile_node(cls)
         NODE_CLASS_MAPPINGS[node_name] = cls
         NODE_DISPLAY_NAME_MAPPINGS[node_name] = update_display_name(cls, category_icon,
                                                                     cls.__dict__.get("DISPLAY_NAME",
@@ -69,16 +78,11 @@ for cls in _NODE_CLASSES:
         raise Exception("Class {} is missing NODE_NAME!".format(str(cls)))
 
 
-def update_node_index():
+def write_node_index(node_list_path: str = os.path.join(os.path.dirname(__file__), "node_list.json")):
+    """Writes the node names and descriptions to node_list.json. Called by the installer, never on import."""
     import inspect
-    node_list_path = os.path.join(os.path.dirname(__file__), "node_list.json")
-    if os.path.isfile(node_list_path):
-        return
     node_list = dict()
     for nodename in NODE_CLASS_MAPPINGS.keys():
         node_list[nodename] = inspect.getdoc(NODE_CLASS_MAPPINGS[nodename])
     with open(node_list_path, "w") as f:
         f.write(json.dumps(node_list, indent=2, sort_keys=True))
-
-
-update_node_index()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the bitmap, shape and conversion hot paths of Dream Painter.
+
+Runs outside of ComfyUI - the package is loaded without running its ComfyUI registration. Time and peak memory of
+every case are written to a JSON file, and a previous JSON file can be given to compare against:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+Peak memory is measured with tracemalloc, which sees numpy buffers and Python objects but not torch's allocator.
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PACKAGE = "dpaint_bench"
+
+
+def _load_package():
+    """Imports core and dreamnodes below a synthetic parent package, skipping the ComfyUI registration in the
+    package __init__ (which also reads the configuration)."""
+    package = types.ModuleType(_PACKAGE)
+    package.__path__ = [_ROOT]
+    sys.modules[_PACKAGE] = package
+    core = importlib.import_module(_PACKAGE + ".core")
+    nodes = importlib.import_module(_PACKAGE + ".dreamnodes")
+    return core, nodes
+
+
+def _measure(function, repeat: int) -> dict:
+    times = list()
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds_min": min(times), "seconds_median": statistics.median(times), "peak_bytes": peak}
+
+
+def _cases(core, nodes, sizes, vertex_counts):
+    import numpy
+    import torch
+
+    rng = numpy.random.default_rng(1234)
+
+    def random_bitmap(size):
+        bits = rng.integers(0, 256, size=(1, size, core.packed_stride(size)), dtype=numpy.uint8)
+        return core.BitMapImage.from_packed(core.clear_padding(bits, size), size)
+
+    def polygon(vertices):
+        return nodes.DPaint_NPolygon().result(0.8, 0.7, 0.5, 0.5, vertices)[0]
+
+    for size in sizes:
+        a = random_bitmap(size)
+        b = random_bitmap(size)
+        half = size // 2
+        yield "bitmap_invert", {"size": size}, lambda a=a: a.invert()
+        yield "bitmap_xor", {"size": size}, lambda a=a, b=b: a.logical_xor(b)
+        yield "bitmap_and", {"size": size}, lambda a=a, b=b: a.logical_and(b)
+        yield "bitmap_or", {"size": size}, lambda a=a, b=b: a.logical_or(b)
+        yield "bitmap_crop", {"size": size}, lambda a=a, s=size: a.crop(s // 4 + 3, s // 4, s // 2, s // 2)
+        yield "bitmap_paste", {"size": size}, lambda a=a, b=b, s=size: a.paste(b.crop(0, 0, s // 2, s // 2), s // 3, 5)
+        yield "bitmap_resize", {"size": size}, lambda a=a, h=half: a.resize_to(h, h)
+        yield "bitmap_rotate", {"size": size}, lambda a=a, s=size: a.rotate(s / 2, s / 2, 30)
+        yield "bitmap_edge_detect", {"size": size}, lambda a=a: a.edge_detect()
+        yield "bitmap_to_tensor", {"size": size}, lambda a=a: a.as_tensor_image_and_mask()
+        image = torch.rand((1, size, size, 3), dtype=torch.float32)
+        yield "image_to_bitmap", {"size": size}, \
+            lambda image=image: nodes.DPaint_ImageToBitmap().result(0.5, IMAGE=image)
+
+    for size in sizes:
+        for vertices in vertex_counts:
+            shape = polygon(vertices)
+            grid = nodes.DPaint_ShapeGrid().result(polygon(vertices), 0.9, 0.9, 16, 16, 0, 0)[0]
+            for mode in ("normal", "xor"):
+                xor = mode == "xor"
+                params = {"size": size, "vertices": vertices, "mode": mode}
+
+                def draw(s, xor=xor, size=size):
+                    canvas = core.BitCanvas(size, size)
+                    s.draw(canvas, xor, True, 1, (core.Vector2d(0, 0), core.Vector2d(1, 1)))
+                    return canvas.bitmap()
+
+                yield "draw_polygon", params, lambda shape=shape, draw=draw: draw(shape)
+                yield "draw_grid_16x16", params, lambda grid=grid, draw=draw: draw(grid)
+
+    # Filled xor drawing of circular rays: a single polygon with many long edges, as in examples/rays_of_color.json.
+    for size in sizes:
+        for rays in (20, 2000, 10000):
+            shape = nodes.DPaint_Rays().result(0.35, 0.5, 0.5, 0.5, rays, 2.0)[0]
+
+            def draw_rays(shape=shape, size=size):
+                canvas = core.BitCanvas(size, size)
+                shape.draw(canvas, True, True, 1, (core.Vector2d(0, 0), core.Vector2d(1, 1)))
+                return canvas.bitmap()
+
+            yield "draw_rays_xor", {"size": size, "rays": rays}, draw_rays
+
+    for vertices in vertex_counts:
+        shape = polygon(vertices)
+        for columns in (16, 64, 256):
+            yield "shape_grid", {"vertices": vertices, "columns": columns}, \
+                lambda shape=shape, c=columns: nodes.DPaint_ShapeGrid().result(shape, 0.9, 0.9, c, c, 0, 0)[0] \
+                .get_bounds()
+        for copies in (10, 100, 1000):
+            yield "copycat", {"vertices": vertices, "copies": copies}, \
+                lambda shape=shape, c=copies: nodes.DPaint_CopyCat().result(shape, c, 0.01, 0.0, 3.0, 0.99, "yes",
+                                                                           "yes")[0].get_bounds()
+
+
+def _revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=_ROOT, stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _key(result: dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def _compare(results: list, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+    print("\n{:<60} {:>10} {:>10} {:>8} {:>8}".format("case", "before", "after", "time", "memory"))
+    for r in results:
+        before = baseline.get(_key(r))
+        if before is None:
+            continue
+        time_ratio = r["seconds_min"] / max(before["seconds_min"], 1e-9)
+        memory_ratio = r["peak_bytes"] / max(before["peak_bytes"], 1)
+        print("{:<60} {:>9.4f}s {:>9.4f}s {:>7.2f}x {:>7.2f}x".format(_key(r)[:60], before["seconds_min"],
+                                                                      r["seconds_min"], time_ratio, memory_ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON file from an earlier run to compare the results with")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of every case")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024, 4096], help="canvas sizes in pixels")
+    parser.add_argument("--vertices", type=int, nargs="+", default=[16, 256, 4096], help="polygon vertex counts")
+    parser.add_argument("--filter", default="", help="only run cases with names containing this text")
+    args = parser.parse_args()
+
+    core, nodes = _load_package()
+    # Measure the work itself, not the caches in front of it.
+    if hasattr(core, "RESULT_CACHE"):
+        core.RESULT_CACHE.max_bytes = 0
+
+    import numpy
+    import torch
+    results = list()
+    for name, params, function in _cases(core, nodes, args.sizes, args.vertices):
+        if args.filter not in name:
+            continue
+        if hasattr(core, "STAMP_CACHE"):
+            core.STAMP_CACHE.clear()
+        result = {"name": name, "params": params}
+        result.update(_measure(function, args.repeat))
+        results.append(result)
+        print("{:<60} {:>9.4f}s {:>10.1f} MB".format(_key(result)[:60], result["seconds_min"],
+                                                     result["peak_bytes"] / 1e6), flush=True)
+
+    report = {
+        "revision": _revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
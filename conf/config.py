@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import copy
 import json
 import os
+import threading
 
 _EMBEDDED_CONFIGURATION = {
     "ui": {
@@ -19,33 +21,52 @@ _EMBEDDED_CONFIGURATION = {
             "shape": "▢",
             "utility": "🧰",
         }
+    },
+    "render": {
+        "stamp_cache_megabytes": 64,
+        "threads": 1
+    },
+    "cache": {
+        "result_cache_megabytes": 1024
+    },
+    "profiling": {
+        "enabled": False,
+        "track_allocations": False,
+        "report_file": ""
     }
 }
 
 _config_data = None
+_config_lock = threading.Lock()
 
 
 class DPaint_Config:
+    """Reads config.json, merged with the embedded defaults, once per process and only when first used. Nothing is
+    written, except by save() - which the installer calls to create or update config.json."""
     FILEPATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
     DEFAULT_CONFIG = _EMBEDDED_CONFIGURATION
 
-    def __init__(self):
+    @property
+    def _data(self) -> dict:
         global _config_data
-        if not os.path.isfile(DPaint_Config.FILEPATH):
-            self._data = DPaint_Config.DEFAULT_CONFIG
-            self._save()
         if _config_data is None:
+            with _config_lock:
+                if _config_data is None:
+                    _config_data = self._load()
+        return _config_data
+
+    def _load(self) -> dict:
+        data = dict()
+        if os.path.isfile(DPaint_Config.FILEPATH):
             with open(DPaint_Config.FILEPATH, encoding="utf-8") as f:
-                self._data = json.load(f)
-                if self._merge_with_defaults(self._data, DPaint_Config.DEFAULT_CONFIG):
-                    self._save()
-                _config_data = self._data
-        else:
-            self._data = _config_data
+                data = json.load(f)
+        self._merge_with_defaults(data, copy.deepcopy(DPaint_Config.DEFAULT_CONFIG))
+        return data
 
-    def _save(self):
+    def save(self):
+        data = self._data
         with open(DPaint_Config.FILEPATH, "w", encoding="utf-8") as f:
-            json.dump(self._data, f, indent=2)
+            json.dump(data, f, indent=2)
 
     def _merge_with_defaults(self, config: dict, default_config: dict) -> bool:
         changed = False
@@ -54,7 +75,7 @@ class DPaint_Config:
                 changed = True
                 config[key] = default_config[key]
             elif isinstance(default_config[key], dict):
-                changed = changed or self._merge_with_defaults(config[key], default_config[key])
+                changed = self._merge_with_defaults(config[key], default_config[key]) or changed
         return changed
 
     def get(self, key: str, default=None):
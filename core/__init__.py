@@ -1,6 +1,10 @@
+from .profiling import *
 from .vector import *
+from .bitpack import *
+from .stamp import *
 from .bitmap import *
 from .images import *
 from .bitcanvas import *
 from .shape import *
+from .cache import *
 
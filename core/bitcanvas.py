@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
-from typing import List, Tuple, Iterable
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Iterable, Callable
 
+import numpy
 from PIL import Image, ImageFilter, ImageEnhance, ImageOps, ImageChops
 from PIL.ImageDraw import ImageDraw
 from typing_extensions import Self
 
 from . import Vector2d
 from .bitmap import BitMapImage
+from .bitpack import pil_to_packed, packed_to_pil, packed_stride
+from .profiling import profiled
+from .raster import fill_polygons_xor, crossing_count
+from .stamp import stamp_polygons
 
 
 def _cf(v: int | float):
@@ -23,22 +30,111 @@ def _coord_box(c1: tuple, c2: tuple):
     return [(x0, y0), (x1, y1)]
 
 
+# Rough costs of XOR:ing filled polygons into a canvas, in nanoseconds. The scanline pass pays per crossing (edge and
+# row pair) and once per canvas pixel, drawing the polygons one at a time with PIL pays per crossing and per pixel of
+# the band of rows every polygon covers.
+_SCANLINE_NS_PER_CROSSING = 250
+_SCANLINE_NS_PER_PIXEL = 5
+_PIL_NS_PER_CROSSING = 30
+_PIL_NS_PER_POLYGON_PIXEL = 0.175
+
+
 class BitCanvas:
+    """A drawing surface for bitmaps, in canvas pixel coordinates. A canvas can hold just a band of rows of the full
+    canvas, [start, stop), while still being drawn on in coordinates of the full canvas. Coordinates are truncated to
+    whole pixels (as PIL does) before they are moved into the band, so a band has the same pixels as those rows of a
+    full canvas. Shifting columns is not exact in the same way, PIL's polygon edges round differently at other x
+    offsets, so bands always span the full width."""
     COLOR_BLACK = "black"
     COLOR_WHITE = "white"
+    # Number of threads to render bitmaps with, see render_bitmap.
+    RENDER_THREADS = 1
 
-    def __init__(self, width: int | float, height: int | float):
-        self._pil_image = Image.new(mode="1", size=(int(round(width)), int(round(height))))
+    def __init__(self, width: int | float, height: int | float, rows: Tuple[int, int] = None):
+        self.width = int(round(width))
+        self.height = int(round(height))
+        self.rows = (0, self.height) if rows is None else rows
+        self._pil_image = Image.new(mode="1", size=(self.width, self.rows[1] - self.rows[0]))
         self._draw = ImageDraw(im=self._pil_image, mode="1")
         self._draw.fill = True
         self._fill_color = BitCanvas.COLOR_WHITE
-        self.width = self._pil_image.width
-        self.height = self._pil_image.height
         self.last_x = self.width - 1
         self.last_y = self.height - 1
 
+    def _band_xy(self, xy):
+        if not self.rows[0]:
+            return xy
+        points = numpy.trunc(numpy.asarray(xy, dtype=numpy.float64).reshape(-1, 2)).astype(numpy.int64)
+        points[:, 1] -= self.rows[0]
+        return points.ravel().tolist()
+
+    def clear(self):
+        """Clears the canvas to black, reusing its buffer, and resets the drawing state."""
+        self._pil_image.paste(0, (0, 0) + self._pil_image.size)
+        self._draw.fill = True
+        self._fill_color = BitCanvas.COLOR_WHITE
+
+    def touches_rows(self, points: numpy.ndarray, margin: int = 0) -> bool | numpy.ndarray:
+        """Whether polygons of (..., N, 2) canvas coordinates, drawn with lines reaching margin pixels out, can touch
+        the rows of this canvas."""
+        if not points.shape[-2]:
+            return numpy.ones(points.shape[:-2], dtype=bool)
+        y = points[..., 1]
+        return (y.max(axis=-1) >= self.rows[0] - margin - 1) & (y.min(axis=-1) < self.rows[1] + margin + 1)
+
+    @profiled("BitCanvas.combine_xor")
     def combine_xor(self, other: Self):
-        self._pil_image = ImageChops.logical_xor(self._pil_image, other._pil_image)
+        self._set_image(ImageChops.logical_xor(self._pil_image, other._pil_image))
+
+    @profiled("BitCanvas.combine_xor_band")
+    def combine_xor_band(self, other: Self):
+        """XORs a band of this canvas (see band_copy) into the rows it covers."""
+        box = (0, other.rows[0] - self.rows[0], self.width, other.rows[1] - self.rows[0])
+        self._pil_image.paste(ImageChops.logical_xor(self._pil_image.crop(box), other._pil_image), box[:2])
+
+    def _set_image(self, pil_image: Image.Image):
+        fill = self._draw.fill
+        self._pil_image = pil_image
+        self._draw = ImageDraw(im=self._pil_image, mode="1")
+        self._draw.fill = fill
+
+    @profiled("BitCanvas.polygons_xor")
+    def polygons_xor(self, polygons: List[numpy.ndarray]):
+        """XORs the filled polygons (arrays of canvas coordinates) into the canvas, in a single scanline pass or, when
+        that is estimated to be slower, by drawing them one at a time with PIL."""
+        if not polygons:
+            return
+        crossings = crossing_count(polygons, self.height, self.rows)
+        pixels = self.width * (self.rows[1] - self.rows[0])
+        scanline = crossings * _SCANLINE_NS_PER_CROSSING + pixels * _SCANLINE_NS_PER_PIXEL
+        band_pixels = 0
+        for polygon in polygons:
+            start, stop = self._band_rows(polygon, 0)
+            band_pixels += self.width * (stop - start)
+        one_by_one = crossings * _PIL_NS_PER_CROSSING + band_pixels * _PIL_NS_PER_POLYGON_PIXEL
+        if one_by_one < scanline:
+            for polygon in polygons:
+                copy = self.band_copy(polygon)
+                if copy is not None:
+                    copy.polygon(polygon.ravel().tolist())
+                    self.combine_xor_band(copy)
+            return
+        bits = pil_to_packed(self._pil_image)
+        fill_polygons_xor(bits, self.width, polygons, self.rows[0], self.height)
+        self._set_image(packed_to_pil(bits, self.width))
+
+    @profiled("BitCanvas.polygons_stamp")
+    def polygons_stamp(self, polygons: numpy.ndarray, xor: bool = False) -> numpy.ndarray:
+        """Fills (K, N, 2) polygons that repeat by translation by stamping a cached raster of each distinct polygon,
+        either XOR:ed or in white. Returns the polygons that could not be stamped, for the caller to draw."""
+        if not len(polygons) or (not xor and self._fill_color != BitCanvas.COLOR_WHITE):
+            return polygons
+        bits = pil_to_packed(self._pil_image)
+        stamped = stamp_polygons(bits, self.width, polygons, xor, first_row=self.rows[0])
+        if not stamped.any():
+            return polygons
+        self._set_image(packed_to_pil(bits, self.width))
+        return polygons[~stamped]
 
     def set_fill(self, fill):
         if fill:
@@ -47,7 +143,25 @@ class BitCanvas:
             self._draw.fill = False
 
     def clear_copy(self):
-        return BitCanvas(self.width, self.height)
+        return BitCanvas(self.width, self.height, self.rows)
+
+    def _band_rows(self, points: numpy.ndarray, margin: int) -> Tuple[int, int]:
+        """The [start, stop) rows of this canvas that (N, 2) canvas coordinates, drawn with lines reaching margin
+        pixels out, can touch."""
+        y = points[:, 1]
+        start = max(int(numpy.trunc(y.min())) - margin - 1, self.rows[0])
+        stop = min(int(numpy.trunc(y.max())) + margin + 2, self.rows[1])
+        return start, max(start, stop)
+
+    def band_copy(self, points: numpy.ndarray, margin: int = 0) -> Self | None:
+        """A clear canvas of just the band of rows of this one that (N, 2) canvas coordinates, drawn with lines
+        reaching margin pixels out, can touch, or None when they can not touch it."""
+        if not len(points):
+            return None
+        start, stop = self._band_rows(points, margin)
+        if stop <= start:
+            return None
+        return BitCanvas(self.width, self.height, (start, stop))
 
     def multiply_vector_with_dimensions(self, v: Vector2d, viewport: Tuple[Vector2d, Vector2d]) -> Vector2d:
         viewport_width = viewport[1].x - viewport[0].x
@@ -59,6 +173,14 @@ class BitCanvas:
         vout = Vector2d(normalized_v.x * self.last_x, normalized_v.y * self.last_y)
         return vout
 
+    def map_to_canvas(self, points: numpy.ndarray, viewport: Tuple[Vector2d, Vector2d]) -> numpy.ndarray:
+        viewport_width = viewport[1].x - viewport[0].x
+        viewport_height = viewport[1].y - viewport[0].y
+        out = numpy.empty_like(points, dtype=numpy.float64)
+        out[..., 0] = (points[..., 0] - viewport[0].x) / viewport_width * self.last_x
+        out[..., 1] = (points[..., 1] - viewport[0].y) / viewport_height * self.last_y
+        return out
+
     def flip_draw_color(self):
         if self._fill_color == "white":
             self._fill_color = "black"
@@ -84,13 +206,13 @@ class BitCanvas:
             return (1,)
 
     def line(self, x1, y1, x2, y2, width):
-        self._draw.line(xy=((x1, y1), (x2, y2)), fill=self._pil_color(), width=width)
+        self._draw.line(xy=self._band_xy(((x1, y1), (x2, y2))), fill=self._pil_color(), width=width)
 
     def polyline(self, xy: Iterable[Tuple[int | float, int | float]], width):
-        self._draw.line(xy=xy, fill=self._pil_color(), width=width)
+        self._draw.line(xy=self._band_xy(xy), fill=self._pil_color(), width=width)
 
     def polygon(self, points: List[Tuple[int | float, int | float]]):
-        self._draw.polygon(xy=points, fill=self._pil_color(), outline=self._pil_color())
+        self._draw.polygon(xy=self._band_xy(points), fill=self._pil_color(), outline=self._pil_color())
 
     def color_black(self):
         self._fill_color = "black"
@@ -99,10 +221,76 @@ class BitCanvas:
         self._fill_color = "white"
 
     def ellipse(self, coordinate1: Tuple[int | float, int | float], coordinate2: Tuple[int | float, int | float]):
-        self._draw.ellipse(_coord_box(coordinate1, coordinate2), fill=self._fill_color, width=0)
+        self._draw.ellipse(self._band_xy(_coord_box(coordinate1, coordinate2)), fill=self._fill_color, width=0)
 
     def rectangle(self, coordinate1: Tuple[int | float, int | float], coordinate2: Tuple[int | float, int | float]):
-        self._draw.rectangle(_coord_box(coordinate1, coordinate2), fill=self._fill_color, width=0)
+        self._draw.rectangle(self._band_xy(_coord_box(coordinate1, coordinate2)), fill=self._fill_color, width=0)
 
     def bitmap(self):
-        return BitMapImage(self._pil_image.convert("1"))
+        return BitMapImage(self._pil_image)
+
+    def packed_bits(self) -> numpy.ndarray:
+        return pil_to_packed(self._pil_image)
+
+
+# Bands are at least this many rows high.
+_MIN_BAND_ROWS = 64
+
+
+@profiled("render_bitmap")
+def render_bitmap(width: int, height: int, draw: Callable[[BitCanvas], None], threads: int = None) -> BitMapImage:
+    """Renders a bitmap by calling draw with a canvas. With more than one thread, draw is called for horizontal bands
+    of the canvas in parallel and the bands are written straight into the rows of the bitmap."""
+    if threads is None:
+        threads = BitCanvas.RENDER_THREADS
+    width = int(round(width))
+    height = int(round(height))
+    bands = min(threads, height // _MIN_BAND_ROWS)
+    if threads <= 1 or bands <= 1:
+        canvas = BitCanvas(width, height)
+        draw(canvas)
+        return canvas.bitmap()
+
+    bits = numpy.empty((1, height, packed_stride(width)), dtype=numpy.uint8)
+    edges = numpy.linspace(0, height, bands + 1).astype(int).tolist()
+
+    def render_band(rows: Tuple[int, int]):
+        canvas = BitCanvas(width, height, rows)
+        draw(canvas)
+        bits[0, rows[0]:rows[1]] = canvas.packed_bits()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(render_band, zip(edges[:-1], edges[1:])))
+    return BitMapImage.from_packed(bits, width)
+
+
+@profiled("render_bitmaps")
+def render_bitmaps(width: int, height: int, draws: List[Callable[[BitCanvas], None]],
+                   threads: int = None) -> BitMapImage:
+    """Renders a batch of bitmaps, one frame for each draw function. Frames are rendered in parallel with more than
+    one thread, and every thread reuses a single canvas for its frames."""
+    if threads is None:
+        threads = BitCanvas.RENDER_THREADS
+    width = int(round(width))
+    height = int(round(height))
+    if not draws:
+        raise Exception("No frames to render!")
+    bits = numpy.empty((len(draws), height, packed_stride(width)), dtype=numpy.uint8)
+    local = threading.local()
+
+    def render_frame(index: int):
+        canvas = getattr(local, "canvas", None)
+        if canvas is None:
+            canvas = local.canvas = BitCanvas(width, height)
+        else:
+            canvas.clear()
+        draws[index](canvas)
+        bits[index] = canvas.packed_bits()
+
+    if threads <= 1 or len(draws) == 1:
+        for index in range(len(draws)):
+            render_frame(index)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(render_frame, range(len(draws))))
+    return BitMapImage.from_packed(bits, width)
@@ -1,15 +1,25 @@
 # -*- coding: utf-8 -*-
+import hashlib
 from io import BytesIO
-from typing import List, Tuple
+from typing import List, Tuple, TYPE_CHECKING
 
 import numpy
-import torch
-from PIL import Image, ImageFilter, ImageEnhance, ImageChops, ImageOps
-from torch import Tensor
+from PIL import Image, ImageFilter
 from typing_extensions import Self
 import PIL
 
+from .bitpack import BYTE_PIXELS, packed_stride, clear_padding, pack_bits, unpack_bits, pil_to_packed, packed_to_pil, \
+    extract_bits, insert_bits
 from .images import Painter_Image, PaintColor
+from .components import Runs, label_runs, label_map, filter_components
+from .coverage import coverage
+from .distance import distance_field
+from .morphology import morphology, edges
+from .profiling import profiled
+from .rotate import rotate_bits
+
+if TYPE_CHECKING:
+    from torch import Tensor
 
 def fix_broken_image(pil_image: PIL.Image.Image) -> PIL.Image.Image:
     output = BytesIO()
@@ -25,100 +35,258 @@ class BitMapImage:
     def __init__(self, pil_image: Image):
         if not isinstance(pil_image, PIL.Image.Image):
             raise Exception("Not a PIL Image - "+str(type(pil_image)))
-        if pil_image.mode != "1":
-            self._pil_image = pil_image.convert("1")
-        else:
-            self._pil_image = pil_image
+        self._bits = pil_to_packed(pil_image)[None]
+        self._width = pil_image.width
+        self._fingerprint = None
+        self._ensure_min_size()
+
+    @classmethod
+    def from_packed(cls, bits: numpy.ndarray, width: int) -> Self:
+        if bits.ndim == 2:
+            bits = bits[None]
+        if bits.ndim != 3 or bits.shape[-1] != packed_stride(width) or bits.shape[0] < 1:
+            raise Exception("Bad packed bitmap shape {} for width {}".format(bits.shape, width))
+        bm = cls.__new__(cls)
+        bm._bits = bits
+        bm._width = int(width)
+        bm._fingerprint = None
+        bm._ensure_min_size()
+        return bm
+
+    @classmethod
+    def from_frames(cls, frames: List[Self]) -> Self:
+        if not frames:
+            raise Exception("No bitmap frames provided!")
+        for frame in frames[1:]:
+            frames[0]._check_same_size(frame)
+        if len(frames) == 1:
+            return frames[0]
+        return BitMapImage.from_packed(numpy.concatenate([f._bits for f in frames]), frames[0].width)
+
+    @classmethod
+    @profiled("BitMapImage.from_tensor")
+    def from_tensor(cls, tensor: "Tensor", threshold: float = 0.5) -> Self:
+        """Thresholds an IMAGE ([B,H,W,C]) or MASK ([B,H,W]) tensor into a batch of bitmaps. Images use the
+        same integer luminance as PIL's grayscale conversion."""
+        if tensor.ndim == 2:
+            tensor = tensor[None]
+        if tensor.ndim not in (3, 4) or tensor.shape[0] == 0:
+            raise Exception("Unsupported tensor shape for bitmap conversion - " + str(tuple(tensor.shape)))
+        import torch
+        limit = int(round(255 * threshold))
+        width = tensor.shape[2]
+        bits = numpy.empty((tensor.shape[0], tensor.shape[1], packed_stride(width)), dtype=numpy.uint8)
+        for i, frame in enumerate(tensor):
+            levels = (frame * 255.0).clamp(0, 255).to(torch.uint8)
+            if levels.ndim == 3:
+                if levels.shape[-1] >= 3:
+                    levels = levels[..., :3].to(torch.int32)
+                    levels = (levels[..., 0] * 19595 + levels[..., 1] * 38470 + levels[..., 2] * 7471 + 0x8000) >> 16
+                else:
+                    levels = levels[..., 0]
+            bits[i] = pack_bits((levels > limit).cpu().numpy())
+        return BitMapImage.from_packed(bits, width)
+
+    def _ensure_min_size(self):
         if self.width < BitMapImage.MIN_SIZE_PIXELS or self.height < BitMapImage.MIN_SIZE_PIXELS:
             factor = max(BitMapImage.MIN_SIZE_PIXELS / self.width, BitMapImage.MIN_SIZE_PIXELS / self.height)
             newimg = self.resize_to(int(round(factor * self.width)), int(round(factor * self.height)))
-            self._pil_image = newimg._pil_image
+            self._bits = newimg._bits
+            self._width = newimg._width
+
+    def _check_same_size(self, other: Self):
+        if self.width != other.width or self.height != other.height:
+            raise Exception("Bitmap sizes do not match - {}x{} and {}x{}".format(self.width, self.height,
+                                                                                 other.width, other.height))
+
+    def _check_batch(self, other: Self):
+        if self.batch_size != other.batch_size and 1 not in (self.batch_size, other.batch_size):
+            raise Exception("Bitmap batch sizes do not match - {} and {}".format(self.batch_size,
+                                                                               other.batch_size))
+
+    @profiled("BitMapImage.combine")
+    def _combine(self, other: Self, op) -> Self:
+        self._check_same_size(other)
+        self._check_batch(other)
+        return BitMapImage.from_packed(op(self._bits, other._bits), self.width)
 
+    def _map_frames_pil(self, f) -> Self:
+        return BitMapImage.from_frames([BitMapImage(f(img)) for img in self.as_pil_bitmaps()])
 
     def paste(self, bitmap : Self, x, y):
-        img = self._pil_image.copy()
-        img.paste(bitmap._pil_image, (x,y))
-        return BitMapImage(img)
+        self._check_batch(bitmap)
+        batch_size = max(self.batch_size, bitmap.batch_size)
+        bits = numpy.broadcast_to(self._bits, (batch_size,) + self._bits.shape[1:]).copy()
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + bitmap.width, self.width)
+        y1 = min(y + bitmap.height, self.height)
+        if x1 > x0 and y1 > y0:
+            part = extract_bits(bitmap._bits[:, y0 - y:y1 - y], x0 - x, x1 - x0)
+            insert_bits(bits[:, y0:y1], part, x0, x1 - x0)
+        return BitMapImage.from_packed(bits, self.width)
 
     @classmethod
-    def new_of_size(cls, width: int, height: int, fill_color = 0):
-        return BitMapImage(Image.new("1",(width,height), color=fill_color))
+    def new_of_size(cls, width: int, height: int, fill_color = 0, batch_size: int = 1):
+        if isinstance(fill_color, tuple):
+            fill_color = fill_color[0]
+        width = max(int(width), 1)
+        height = max(int(height), 1)
+        shape = (max(int(batch_size), 1), height, packed_stride(width))
+        if fill_color:
+            bits = numpy.full(shape, 0xff, dtype=numpy.uint8)
+            clear_padding(bits, width)
+        else:
+            bits = numpy.zeros(shape, dtype=numpy.uint8)
+        return BitMapImage.from_packed(bits, width)
 
     @property
     def _img(self) -> Image:
-        return self._pil_image
+        return self.as_pil_bitmap()
+
+    @property
+    def packed_bits(self) -> numpy.ndarray:
+        return self._bits
+
+    def fingerprint(self) -> str:
+        """A hash of the size and pixels of the bitmap. Bitmaps are never modified, so it is computed once."""
+        if self._fingerprint is None:
+            h = hashlib.blake2b(digest_size=20)
+            h.update("bitmap:{}:{};".format(self._width, self._bits.shape).encode("utf-8"))
+            h.update(numpy.ascontiguousarray(self._bits).data)
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
 
     @property
     def width(self) -> int:
-        return self._pil_image.size[0]
+        return self._width
 
     @property
     def height(self) -> int:
-        return self._pil_image.size[1]
+        return self._bits.shape[1]
+
+    @property
+    def batch_size(self) -> int:
+        return self._bits.shape[0]
+
+    def frame(self, index: int) -> Self:
+        return BitMapImage.from_packed(self._bits[index:index + 1], self.width)
+
+    def frames(self) -> List[Self]:
+        return [self.frame(i) for i in range(self.batch_size)]
 
     def resize_to(self, width, height):
-        return BitMapImage(self._pil_image.resize((width,height)))
+        return self._map_frames_pil(lambda img: img.resize((width, height)))
 
     def crop(self, x, y, width, height):
-        return BitMapImage(self._pil_image.crop((x,y,x+width,y+height)))
+        x, y, width, height = int(x), int(y), int(width), int(height)
+        bits = numpy.zeros((self.batch_size, height, packed_stride(width)), dtype=numpy.uint8)
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x1 > x0 and y1 > y0:
+            part = extract_bits(self._bits[:, y0:y1], x0, x1 - x0)
+            insert_bits(bits[:, y0 - y:y1 - y], part, x0 - x, x1 - x0)
+        return BitMapImage.from_packed(bits, width)
 
     def logical_xor(self, other):
-        return BitMapImage(ImageChops.logical_xor(self._pil_image, other._pil_image))
+        return self._combine(other, numpy.bitwise_xor)
 
     def logical_and(self, other):
-        return BitMapImage(ImageChops.logical_and(self._pil_image, other._pil_image))
+        return self._combine(other, numpy.bitwise_and)
 
     def logical_or(self, other):
-        return BitMapImage(ImageChops.logical_or(self._pil_image, other._pil_image))
+        return self._combine(other, numpy.bitwise_or)
 
     def invert(self):
-        return BitMapImage(ImageChops.invert(self._pil_image))
+        return BitMapImage.from_packed(clear_padding(~self._bits, self.width), self.width)
+
+    def morphology(self, operation: str, radius: int, element: str = "square") -> Self:
+        """Dilates, erodes, opens or closes every frame with a square, cross or disc of the given radius."""
+        return BitMapImage.from_packed(morphology(self._bits, self.width, operation, radius, element), self.width)
+
+    def components(self, connectivity: int = 8) -> Runs:
+        """The 4 or 8 connected components of white pixels in every frame."""
+        return label_runs(self._bits, self.width, connectivity)
+
+    def filter_components(self, mode: str, amount: int, connectivity: int = 8) -> Self:
+        return BitMapImage.from_packed(filter_components(self._bits, self.width, mode, amount, connectivity),
+                                       self.width)
+
+    def as_tensor_labels(self, runs: Runs) -> "Tensor":
+        """A mask with the component label (from 1, per frame) of every pixel and 0 for black pixels."""
+        import torch
+        return torch.from_numpy(label_map(self._bits, self.width, runs).astype(numpy.float32))
 
     def rotate(self, center_x, center_y, degrees, expand = True, fill_color = 0):
-        if fill_color:
-            fill_color = (1,)
-        else:
-            fill_color = (0,)
-        return BitMapImage(self._pil_image.rotate(degrees, fillcolor = fill_color, resample=Image.BILINEAR, expand = expand, center = (center_x, center_y)))
+        rotated = rotate_bits(self._bits, self.width, center_x, center_y, degrees, expand, 1 if fill_color else 0)
+        if rotated is None:
+            return self._map_frames_pil(lambda img: img.rotate(degrees, resample=Image.NEAREST, expand=expand,
+                                                               center=(center_x, center_y),
+                                                               fillcolor=(1,) if fill_color else (0,)))
+        return BitMapImage.from_packed(*rotated)
+
+    def edge_detect(self, mode: str = "classic", connectivity: int = 8) -> Self:
+        """Finds edges with PIL's FIND_EDGES filter (classic), or as the inner, outer or both sided one pixel
+        boundaries of the white areas."""
+        if mode == "classic":
+            return self._map_frames_pil(lambda img: img.filter(ImageFilter.FIND_EDGES).convert("1"))
+        return BitMapImage.from_packed(edges(self._bits, self.width, mode, connectivity), self.width)
 
-    def edge_detect(self) -> Self:
-        return BitMapImage(self._pil_image.filter(ImageFilter.FIND_EDGES).convert("1"))
+    def as_pil_bitmap(self, index: int = 0):
+        return packed_to_pil(self._bits[index], self.width)
 
-    def as_pil_bitmap(self):
-        return self._pil_image
+    def as_pil_bitmaps(self) -> List[Image.Image]:
+        return [self.as_pil_bitmap(i) for i in range(self.batch_size)]
 
+    @profiled("BitMapImage.as_pil_image")
     def as_pil_image(self, with_alpha=False, col0: PaintColor = PaintColor("000000"),
-                     col1: PaintColor = PaintColor("ffffff")) -> Image:
-        mode = "RGB"
-        if with_alpha:
-            mode += "A"
-
-        red_range = (col0.red_int, col1.red_int)
-        green_range = (col0.green_int, col1.green_int)
-        blue_range = (col0.blue_int, col1.blue_int)
-        alpha_range = (col0.alpha_int, col1.alpha_int)
-
-        converted = self._pil_image.convert("L")
-        gray_band = converted.split()[0]
-
-        red_band = gray_band.point(lambda i: int((i // 255) * (red_range[1] - red_range[0]) + red_range[0]))
-        green_band = gray_band.point(lambda i: int((i // 255) * (green_range[1] - green_range[0]) + green_range[0]))
-        blue_band = gray_band.point(lambda i: int((i // 255) * (blue_range[1] - blue_range[0]) + blue_range[0]))
-        if with_alpha:
-            alpha_band = gray_band.point(lambda i:int((i // 255) * (alpha_range[1] - alpha_range[0]) + alpha_range[0]))
-            return Image.merge("RGBA", (red_band, green_band, blue_band, alpha_band))
-        else:
-            return Image.merge("RGB", (red_band, green_band, blue_band))
+                     col1: PaintColor = PaintColor("ffffff"), index: int = 0) -> Image:
+        lut = numpy.array([[col0.red_int, col0.green_int, col0.blue_int, col0.alpha_int],
+                           [col1.red_int, col1.green_int, col1.blue_int, col1.alpha_int]], dtype=numpy.uint8)
+        if not with_alpha:
+            lut = numpy.ascontiguousarray(lut[:, :3])
+        return Image.fromarray(lut[unpack_bits(self._bits[index], self.width)])
+
+    @profiled("BitMapImage.as_tensor_distance_field")
+    def as_tensor_distance_field(self, signed: bool = False, max_distance: float = 0.0) -> Tuple["Tensor", "Tensor"]:
+        """Euclidean distance to the nearest white pixel as an image and a mask, in pixels, or divided by
+        max_distance and clamped when that is above zero. With signed, white pixels get minus the distance to the
+        nearest black pixel."""
+        import torch
+        field = distance_field(self._bits, self.width, signed)
+        if max_distance > 0:
+            field = numpy.clip(field / numpy.float32(max_distance), -1.0, 1.0)
+        mask = torch.from_numpy(field)
+        return mask[..., None].repeat(1, 1, 1, 3), mask
+
+    def as_tensor_coverage(self, width: int, height: int) -> Tuple["Tensor", "Tensor"]:
+        """Resizes with a box filter into an image and a mask of the fraction of white pixels under every new
+        pixel."""
+        import torch
+        mask = torch.from_numpy(coverage(self._bits, self.width, width, height))
+        return mask[..., None].repeat(1, 1, 1, 3), mask
 
+    @profiled("BitMapImage.as_tensor_image_and_mask")
     def as_tensor_image_and_mask(self, col0: PaintColor = PaintColor("000000"),
-                     col1: PaintColor = PaintColor("ffffff")) -> Tuple[Tensor, Tensor]:
-        def _convert_from_pil_to_tensor(pil_image):
-            pil_image = pil_image.convert("RGBA")
-            i = ImageOps.exif_transpose(pil_image)
-            image = i.convert("RGB")
-            image = numpy.array(image).astype(numpy.float32) / 255.0
-            image = torch.from_numpy(image)[None,]
-            mask = numpy.array(i.getchannel('A')).astype(numpy.float32) / 255.0
-            mask = 1. - torch.from_numpy(mask)
-            return image, mask
-        return _convert_from_pil_to_tensor(self.as_pil_image(with_alpha=True, col0=col0, col1= col1))
+                     col1: PaintColor = PaintColor("ffffff")) -> Tuple["Tensor", "Tensor"]:
+        colors = numpy.array([[col0.red_int, col0.green_int, col0.blue_int],
+                              [col1.red_int, col1.green_int, col1.blue_int]], dtype=numpy.float32) / 255.0
+        mask_values = 1. - numpy.array([col0.alpha_int, col1.alpha_int], dtype=numpy.float32) / 255.0
+        import torch
+        # Every packed byte is looked up as the values of its 8 pixels, written straight into the outputs. Arrays
+        # from numpy are faster to fill than fresh torch buffers, which do not get huge pages.
+        image_data = numpy.empty((self.batch_size, self.height, self.width, 3), dtype=numpy.float32)
+        mask_data = numpy.empty((self.batch_size, self.height, self.width), dtype=numpy.float32)
+        full = self.width >> 3
+        for lut, out in ((colors[BYTE_PIXELS], image_data),
+                         (mask_values[BYTE_PIXELS][..., None], mask_data[..., None])):
+            channels = lut.shape[-1]
+            whole = out[:, :, :full * 8].reshape(self.batch_size, self.height, full, 8 * channels)
+            numpy.take(lut.reshape(256, 8 * channels), self._bits[..., :full], axis=0, out=whole, mode="clip")
+            if self.width > full * 8:
+                out[:, :, full * 8:] = lut[self._bits[..., full]][:, :, :self.width - full * 8]
+        image = torch.from_numpy(image_data)
+        mask = torch.from_numpy(mask_data)
+        return image, mask
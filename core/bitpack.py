@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import numpy
+from PIL import Image
+
+# Packed bitmaps are uint8 arrays with 8 pixels per byte, most significant bit first, and every
+# row padded to a whole byte - the same layout as PIL's raw mode "1" data. Any leading axes
+# are carried along untouched. Padding bits are always kept at zero.
+
+# The 8 pixels of every byte value, BYTE_PIXELS[byte] - a lookup table for mapping whole bytes at once.
+BYTE_PIXELS = numpy.unpackbits(numpy.arange(256, dtype=numpy.uint8)[:, None], axis=1)
+
+
+def packed_stride(width: int) -> int:
+    return (int(width) + 7) >> 3
+
+
+def padding_mask(width: int) -> int:
+    remainder = int(width) & 7
+    if remainder == 0:
+        return 0xff
+    return (0xff << (8 - remainder)) & 0xff
+
+
+def clear_padding(bits: numpy.ndarray, width: int) -> numpy.ndarray:
+    if int(width) & 7:
+        bits[..., -1] &= padding_mask(width)
+    return bits
+
+
+def pack_bits(pixels) -> numpy.ndarray:
+    return numpy.packbits(numpy.asarray(pixels, dtype=bool), axis=-1)
+
+
+def unpack_bits(bits: numpy.ndarray, width: int) -> numpy.ndarray:
+    return numpy.unpackbits(bits, axis=-1, count=int(width))
+
+
+def pil_to_packed(pil_image: Image.Image) -> numpy.ndarray:
+    if pil_image.mode != "1":
+        pil_image = pil_image.convert("1")
+    # Packing the pixels of the image as an array is many times faster than PIL's encoder for mode "1".
+    return numpy.packbits(numpy.asarray(pil_image), axis=-1)
+
+
+def packed_to_pil(bits: numpy.ndarray, width: int) -> Image.Image:
+    return Image.frombytes("1", (int(width), bits.shape[-2]), numpy.ascontiguousarray(bits).tobytes())
+
+
+def shift_bits_left(bits: numpy.ndarray, shift: int) -> numpy.ndarray:
+    """Moves every row towards lower x by 0-7 bits, keeping the row length."""
+    if shift == 0:
+        return bits.copy()
+    out = bits << shift
+    out[..., :-1] |= bits[..., 1:] >> (8 - shift)
+    return out
+
+
+def shift_bits_right(bits: numpy.ndarray, shift: int) -> numpy.ndarray:
+    """Moves every row towards higher x by 0-7 bits, growing the row by one byte."""
+    out = numpy.zeros(bits.shape[:-1] + (bits.shape[-1] + 1,), dtype=numpy.uint8)
+    out[..., :-1] = bits >> shift
+    if shift:
+        out[..., 1:] |= bits << (8 - shift)
+    return out
+
+
+def extract_bits(bits: numpy.ndarray, x: int, width: int) -> numpy.ndarray:
+    first_byte = x >> 3
+    shift = x & 7
+    segment = bits[..., first_byte:first_byte + packed_stride(width + shift)]
+    out = shift_bits_left(segment, shift)[..., :packed_stride(width)]
+    return clear_padding(numpy.ascontiguousarray(out), width)
+
+
+def insert_bits(target: numpy.ndarray, bits: numpy.ndarray, x: int, width: int, op=None):
+    """Writes the packed rows of bits into target at column x. With op set to one of the numpy
+    bitwise ufuncs the bits are combined with the target instead of replacing it."""
+    first_byte = x >> 3
+    shift = x & 7
+    length = packed_stride(width + shift)
+    data = shift_bits_right(bits, shift)[..., :length]
+    region = target[..., first_byte:first_byte + length]
+    if op is None:
+        mask = shift_bits_right(pack_bits(numpy.ones(width, dtype=bool)), shift)[:length]
+        region &= ~mask
+        region |= data
+    elif op is numpy.bitwise_and:
+        mask = shift_bits_right(pack_bits(numpy.ones(width, dtype=bool)), shift)[:length]
+        region &= data | ~mask
+    else:
+        op(region, data, out=region)
+    return target
+
+
+def transpose_bits(bits: numpy.ndarray, width: int) -> numpy.ndarray:
+    """Swaps rows and columns, so row x of the result holds column x of bits. Works on blocks of
+    8 rows by 8 columns held in a uint64, transposed with three rounds of bit swaps."""
+    lead, height, stride = bits.shape[:-2], bits.shape[-2], bits.shape[-1]
+    blocks = packed_stride(height)
+    padded = numpy.zeros(lead + (blocks * 8, stride), dtype=numpy.uint8)
+    padded[..., :height, :] = bits
+    # Block (i, j) holds rows 8i to 8i + 7 of byte j, the first row in the most significant byte.
+    x = numpy.ascontiguousarray(numpy.swapaxes(padded.reshape(lead + (blocks, 8, stride)), -1, -2))
+    x = x.view(">u8")[..., 0].astype(numpy.uint64)
+    for shift, mask in ((7, 0x00AA00AA00AA00AA), (14, 0x0000CCCC0000CCCC), (28, 0x00000000F0F0F0F0)):
+        shift, mask = numpy.uint64(shift), numpy.uint64(mask)
+        t = (x ^ (x >> shift)) & mask
+        x = x ^ t ^ (t << shift)
+    out = x.astype(">u8").view(numpy.uint8).reshape(lead + (blocks, stride * 8))
+    out = numpy.swapaxes(out, -1, -2)[..., :width, :]
+    return numpy.ascontiguousarray(out)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import functools
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from .bitmap import BitMapImage
+from .shape import Shape, ShapeContent, ShapeInstances
+
+
+class ResultCache:
+    """Process wide least recently used cache of node results, limited by the total number of bytes they hold.
+    Results larger than a fraction of the limit are not stored, so a single one can not evict most of the others."""
+    # Largest part of the limit a single result may take.
+    MAX_RESULT_FRACTION = 0.25
+
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Returns the stored (found, result) for the key."""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._results.move_to_end(key)
+            return True, entry[0]
+
+    @property
+    def max_result_bytes(self) -> int:
+        return int(self.max_bytes * ResultCache.MAX_RESULT_FRACTION)
+
+    def put(self, key: str, result):
+        size = result_size(result)
+        with self._lock:
+            if size > self.max_result_bytes or key in self._results:
+                return
+            self._results[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._results.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._results), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+RESULT_CACHE = ResultCache()
+
+
+def _is_tensor(value) -> bool:
+    # No value can be a tensor before torch has been imported, and checking must not import it.
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(value, torch.Tensor)
+
+
+def _update(h, value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        h.update("{}:{!r};".format(type(value).__name__, value).encode("utf-8"))
+    elif isinstance(value, (tuple, list)):
+        h.update("seq:{}(".format(len(value)).encode("utf-8"))
+        for v in value:
+            _update(h, v)
+        h.update(b")")
+    elif isinstance(value, dict):
+        h.update("dict:{}(".format(len(value)).encode("utf-8"))
+        for k in sorted(value.keys(), key=repr):
+            _update(h, k)
+            _update(h, value[k])
+        h.update(b")")
+    elif isinstance(value, numpy.ndarray):
+        h.update("array:{}{};".format(value.dtype.str, value.shape).encode("utf-8"))
+        h.update(numpy.ascontiguousarray(value).data)
+    elif _is_tensor(value):
+        value = value.detach().cpu()
+        if value.dtype == sys.modules["torch"].bfloat16:
+            value = value.float()
+        h.update(b"tensor;")
+        _update(h, value.numpy())
+    elif isinstance(value, (BitMapImage, Shape, ShapeContent, ShapeInstances)):
+        h.update("{}:{};".format(type(value).__name__, value.fingerprint()).encode("utf-8"))
+    else:
+        raise TypeError("Can not fingerprint a {}".format(type(value).__name__))
+
+
+def fingerprint(value) -> str:
+    """A hash of the content of a value - node inputs like numbers, strings, tensors, bitmaps and shapes, and
+    tuples, lists and dicts of them. Equal content gives equal fingerprints."""
+    h = hashlib.blake2b(digest_size=20)
+    _update(h, value)
+    return h.hexdigest()
+
+
+def result_size(value) -> int:
+    """Approximate number of bytes held by a node result."""
+    if isinstance(value, (tuple, list)):
+        return 64 + sum(result_size(v) for v in value)
+    if isinstance(value, BitMapImage):
+        return 64 + value.packed_bits.nbytes
+    if _is_tensor(value):
+        return 64 + value.nelement() * value.element_size()
+    if isinstance(value, numpy.ndarray):
+        return 64 + value.nbytes
+    return 64
+
+
+def cached_result(function):
+    """Decorator for node result methods, returning the stored result when the node has already run with inputs of
+    the same content. Results must not be modified by the receiver, which holds for the types of this package.
+    After a result too large for the cache, the inputs of the next run are not fingerprinted, as its result would
+    most likely not be stored either."""
+    last_too_large = False
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        nonlocal last_too_large
+        if RESULT_CACHE.max_bytes <= 0:
+            return function(self, *args, **kwargs)
+        if last_too_large:
+            result = function(self, *args, **kwargs)
+            last_too_large = result_size(result) > RESULT_CACHE.max_result_bytes
+            return result
+        try:
+            key = fingerprint((type(self).__module__, type(self).__qualname__, args, kwargs))
+        except TypeError:
+            return function(self, *args, **kwargs)
+        found, result = RESULT_CACHE.get(key)
+        if not found:
+            result = function(self, *args, **kwargs)
+            last_too_large = result_size(result) > RESULT_CACHE.max_result_bytes
+            RESULT_CACHE.put(key, result)
+        return result
+
+    return wrapper
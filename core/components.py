@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from typing import Tuple
+
+import numpy
+
+from .bitpack import unpack_bits, pack_bits
+
+# Connected components of packed bitmaps. Every row is split into runs of white pixels, runs on neighbouring rows
+# that touch are joined with a union-find over the runs, and components are numbered per frame in raster order of
+# their first pixel. The joining is done for all touching pairs at once: each round hooks the larger root of every
+# pair that is still split onto the smaller one, and then flattens the trees, until no pair is split.
+
+FILTER_REMOVE_SMALLER = "remove smaller"
+FILTER_REMOVE_LARGER = "remove larger"
+FILTER_KEEP_LARGEST = "keep largest"
+FILTER_MODES = [FILTER_REMOVE_SMALLER, FILTER_REMOVE_LARGER, FILTER_KEEP_LARGEST]
+
+
+class Runs:
+    """Runs of white pixels, in raster order: frame, row, first and last column, and the per frame component label
+    (from 1) of each run."""
+
+    def __init__(self, frame, row, start, end, label, counts):
+        self.frame = frame
+        self.row = row
+        self.start = start
+        self.end = end
+        self.label = label
+        self.counts = counts
+
+    @property
+    def component(self) -> numpy.ndarray:
+        """Index of the component of each run, numbering the components of all frames in a single sequence."""
+        return self.label - 1 + (numpy.cumsum(self.counts) - self.counts)[self.frame]
+
+
+def _expand(starts: numpy.ndarray, counts: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    item = numpy.repeat(numpy.arange(len(counts)), counts)
+    return item, starts[item] + numpy.arange(len(item)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+
+
+def _find_runs(pixels: numpy.ndarray):
+    frames, height, width = pixels.shape
+    edges = numpy.zeros((frames, height, width + 2), dtype=numpy.int8)
+    edges[..., 1:-1] = pixels
+    edges = numpy.diff(edges, axis=-1)
+    frame, row, start = numpy.nonzero(edges == 1)
+    end = numpy.nonzero(edges == -1)[2] - 1
+    return frame, row, start, end
+
+
+def _touching_pairs(line, start, end, connectivity: int):
+    """Pairs of runs on consecutive lines (frame * height + row) that touch."""
+    reach = 1 if connectivity == 8 else 0
+    scale = int(end.max(initial=0)) + 4
+    start_keys = line * scale + start + 2
+    end_keys = line * scale + end + 2
+    below = (line + 1) * scale + 2
+    first = numpy.searchsorted(end_keys, below + start - reach, side="left")
+    stop = numpy.searchsorted(start_keys, below + end + reach, side="right")
+    return _expand(first, numpy.maximum(stop - first, 0))
+
+
+def _union(count: int, a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    """Root of every item, the smallest item of its group, given pairs of items in the same group."""
+    parent = numpy.arange(count)
+    while len(a):
+        root_a, root_b = parent[a], parent[b]
+        split = root_a != root_b
+        if not split.any():
+            break
+        a, b, root_a, root_b = a[split], b[split], root_a[split], root_b[split]
+        numpy.minimum.at(parent, numpy.maximum(root_a, root_b), numpy.minimum(root_a, root_b))
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def label_runs(bits: numpy.ndarray, width: int, connectivity: int = 8) -> Runs:
+    """Finds the 4 or 8 connected components of packed (frames, rows, row bytes) bitmaps."""
+    if connectivity not in (4, 8):
+        raise Exception("Connectivity must be 4 or 8 - " + str(connectivity))
+    frames, height = bits.shape[0], bits.shape[1]
+    frame, row, start, end = _find_runs(unpack_bits(bits, width).astype(bool))
+    line = frame * height + row
+    a, b = _touching_pairs(line, start, end, connectivity)
+    # Runs on the last row of a frame do not touch the first row of the next frame.
+    keep = row[a] + 1 < height
+    root = _union(len(start), a[keep], b[keep])
+    first = root == numpy.arange(len(root))
+    counts = numpy.bincount(frame[first], minlength=frames)
+    numbers = numpy.cumsum(first) - (numpy.cumsum(counts) - counts)[frame]
+    return Runs(frame, row, start, end, numbers[root], counts)
+
+
+def component_stats(runs: Runs) -> dict:
+    """Area and bounding box of every component, as arrays indexed like Runs.component."""
+    component = runs.component
+    total = int(runs.counts.sum())
+    area = numpy.bincount(component, weights=runs.end - runs.start + 1, minlength=total).astype(numpy.int64)
+    x0 = numpy.full(total, numpy.iinfo(numpy.int64).max)
+    numpy.minimum.at(x0, component, runs.start)
+    x1 = numpy.zeros(total, dtype=numpy.int64)
+    numpy.maximum.at(x1, component, runs.end)
+    y1 = numpy.zeros(total, dtype=numpy.int64)
+    numpy.maximum.at(y1, component, runs.row)
+    # Components are numbered in raster order, so the first run of each one is also its top row.
+    first = numpy.unique(component, return_index=True)[1]
+    y0 = runs.row[first]
+    return {"frame": runs.frame[first], "label": runs.label[first], "area": area, "x": x0, "y": y0,
+            "width": x1 - x0 + 1, "height": y1 - y0 + 1}
+
+
+def _paint_runs(shape: Tuple[int, int, int], runs: Runs, values: numpy.ndarray, dtype) -> numpy.ndarray:
+    """Pixels with the value of the run they are in, zero outside of runs."""
+    frames, height, width = shape
+    steps = numpy.zeros(frames * height * (width + 1), dtype=dtype)
+    base = (runs.frame * height + runs.row) * (width + 1)
+    numpy.add.at(steps, base + runs.start, values)
+    numpy.subtract.at(steps, base + runs.end + 1, values)
+    steps = steps.reshape(frames, height, width + 1)
+    return numpy.cumsum(steps, axis=-1, dtype=dtype)[..., :width]
+
+
+def label_map(bits: numpy.ndarray, width: int, runs: Runs) -> numpy.ndarray:
+    """Every pixel set to the label of its component, 0 for black pixels."""
+    return _paint_runs((bits.shape[0], bits.shape[1], width), runs, runs.label, numpy.int64)
+
+
+def filter_components(bits: numpy.ndarray, width: int, mode: str, amount: int, connectivity: int = 8) -> numpy.ndarray:
+    """Removes components smaller or larger (in pixels) than amount, or keeps the amount largest ones of each
+    frame."""
+    runs = label_runs(bits, width, connectivity)
+    if not len(runs.start):
+        return bits.copy()
+    area = component_stats(runs)["area"]
+    if mode == FILTER_REMOVE_SMALLER:
+        keep = area >= amount
+    elif mode == FILTER_REMOVE_LARGER:
+        keep = area <= amount
+    elif mode == FILTER_KEEP_LARGEST:
+        # Per frame, largest first and ties in label order.
+        frame = numpy.repeat(numpy.arange(len(runs.counts)), runs.counts)
+        order = numpy.lexsort((numpy.arange(len(area)), -area, frame))
+        rank = numpy.empty(len(area), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(area)) - (numpy.cumsum(runs.counts) - runs.counts)[frame[order]]
+        keep = rank < amount
+    else:
+        raise Exception("Unknown component filter mode - " + str(mode))
+    kept = _paint_runs((bits.shape[0], bits.shape[1], width), runs, keep[runs.component].astype(numpy.int8),
+                       numpy.int8)
+    return pack_bits(kept)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy
+
+from .bitpack import BYTE_PIXELS, padding_mask, unpack_bits
+
+# Box filtered resizing of packed bitmaps into coverage values. Every output pixel covers a box of the bitmap, with
+# fractional edges when the sizes do not divide, and gets the fraction of that box that is white. Counting along a
+# row up to a fractional position is the popcount of the whole bytes before it, the leading bits of the byte it is in
+# and the fractional part of the pixel it ends in. Differences of those counts give the coverage of every column of
+# boxes, and the same is done down the columns of those. Sizes that divide evenly just add up whole blocks, of bytes
+# when the boxes are a multiple of 8 pixels wide and of the boxes within each byte when they fit in one.
+
+_BIT_COUNTS = BYTE_PIXELS.sum(axis=1)
+
+
+def _box_edges(size: int, new_size: int):
+    """Whole pixel and fraction of the edges of the boxes, in the original pixels."""
+    edges = numpy.arange(new_size + 1, dtype=numpy.float64) * (size / new_size)
+    whole = numpy.minimum(numpy.floor(edges).astype(numpy.int64), size)
+    return whole, edges - whole
+
+
+def _row_counts(bits: numpy.ndarray, width: int, new_width: int) -> numpy.ndarray:
+    """Number of white pixels of every row up to the edges of the boxes, (rows, new_width + 1)."""
+    whole, fraction = _box_edges(width, new_width)
+    rows = bits.shape[0]
+    padded = numpy.zeros((rows, bits.shape[1] + 1), dtype=numpy.uint8)
+    padded[:, :-1] = bits
+    byte_counts = numpy.zeros((rows, padded.shape[1]), dtype=numpy.int64)
+    numpy.cumsum(_BIT_COUNTS[bits], axis=1, out=byte_counts[:, 1:])
+    byte, bit = whole >> 3, whole & 7
+    leading = numpy.array([0] + [padding_mask(n) for n in range(1, 8)], dtype=numpy.uint8)
+    partial = padded[:, byte]
+    counts = (byte_counts[:, byte] + _BIT_COUNTS[partial & leading[bit]]).astype(numpy.float64)
+    counts += fraction * ((partial >> (7 - bit).astype(numpy.uint8)) & 1)
+    return counts
+
+
+def coverage(bits: numpy.ndarray, width: int, new_width: int, new_height: int) -> numpy.ndarray:
+    """Fraction of white pixels in the box each pixel of a new_width by new_height image covers, for every frame of
+    packed (frames, rows, row bytes) bitmaps."""
+    if new_width < 1 or new_height < 1:
+        raise Exception("Coverage size must be at least 1x1 - {}x{}".format(new_width, new_height))
+    frames, height = bits.shape[0], bits.shape[1]
+    if width % new_width == 0 and height % new_height == 0:
+        box_width, box_height = width // new_width, height // new_height
+        if box_width % 8 == 0:
+            counts = _BIT_COUNTS[bits[..., :width >> 3]].reshape(frames, height, new_width, box_width >> 3)
+        elif 8 % box_width == 0 and width % 8 == 0:
+            # Boxes of 1, 2 or 4 pixels: the count of every box in a byte is looked up at once.
+            groups = BYTE_PIXELS.reshape(256, 8 // box_width, box_width).sum(axis=-1, dtype=numpy.uint8)
+            counts = groups[bits].reshape(frames, height, new_width, 1)
+        else:
+            counts = unpack_bits(bits, width).reshape(frames, height, new_width, box_width)
+        counts = counts.sum(axis=-1, dtype=numpy.int32).reshape(frames, new_height, box_height, new_width).sum(axis=2)
+        return (counts / numpy.float32(box_width * box_height)).astype(numpy.float32)
+    whole, fraction = _box_edges(height, new_height)
+    out = numpy.empty((frames, new_height, new_width), dtype=numpy.float32)
+    for i in range(frames):
+        columns = numpy.diff(_row_counts(bits[i], width, new_width), axis=1)
+        # The same counting down the columns, over the per row coverage of every column of boxes.
+        column_counts = numpy.zeros((height + 1, new_width), dtype=numpy.float64)
+        numpy.cumsum(columns, axis=0, out=column_counts[1:])
+        next_row = numpy.vstack((columns, numpy.zeros((1, new_width))))
+        counts = column_counts[whole] + fraction[:, None] * next_row[whole]
+        area = (width / new_width) * (height / new_height)
+        out[i] = numpy.clip(numpy.diff(counts, axis=0) / area, 0.0, 1.0)
+    return out
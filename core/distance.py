@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import numpy
+
+from .bitpack import unpack_bits
+
+# Exact Euclidean distance transform, in two separable passes (Felzenszwalb & Huttenlocher). The first pass finds
+# the distance to the nearest site in every row, the second takes the lower envelope of the parabolas those
+# distances span down every column. The second pass steps down the rows while working on all columns of all frames
+# at once.
+
+
+def _line_distances(sites: numpy.ndarray) -> numpy.ndarray:
+    """Squared distance to the nearest site along the last axis, inf for lines without sites."""
+    far = 1 << 30
+    positions = numpy.arange(sites.shape[-1], dtype=numpy.int32)
+    before = numpy.where(sites, positions, numpy.int32(-far))
+    numpy.maximum.accumulate(before, axis=-1, out=before)
+    after = numpy.where(sites, positions, numpy.int32(far))[..., ::-1]
+    after = numpy.minimum.accumulate(after, axis=-1)[..., ::-1]
+    nearest = numpy.minimum(positions - before, after - positions)
+    f = numpy.square(nearest, dtype=numpy.float64)
+    f[nearest >= far >> 1] = numpy.inf
+    return f
+
+
+# Stands in for the parabolas of positions without a site. Differences of two such values cancel to exactly zero,
+# and any parabola of a real site is lower, so they only remain in the envelope of lines without any site.
+_NO_SITE = 1e30
+
+
+def _envelope(f: numpy.ndarray) -> numpy.ndarray:
+    """Squared distance transform along the first axis of (n, lines) squared site distances f."""
+    n, lines = f.shape
+    positions = numpy.arange(n, dtype=numpy.float64)
+    parabola = numpy.where(numpy.isfinite(f), f, _NO_SITE) + (positions * positions)[:, None]
+    everywhere = numpy.arange(lines)
+    # Per line: the envelope holds k + 1 parabolas, at vertices v, and parabola j is lowest from z[j] to z[j + 1].
+    k = numpy.zeros(lines, dtype=numpy.int64)
+    v = numpy.zeros((n, lines), dtype=numpy.int32)
+    z = numpy.empty((n, lines), dtype=numpy.float64)
+    z[0] = -numpy.inf
+    # Every line pushes the parabola of each position, so the top of the envelope is always the previous position.
+    top_z = z[0]
+    for q in range(1, n):
+        current = parabola[q]
+        s = (current - parabola[q - 1]) * 0.5
+        pending = numpy.nonzero(s <= top_z)[0]
+        # Parabolas hidden by the new one are popped, as long as any line has one to pop.
+        while len(pending):
+            k[pending] -= 1
+            kp = k[pending]
+            vk = v[kp, pending]
+            sp = (current[pending] - parabola[vk, pending]) / (2.0 * (q - vk))
+            s[pending] = sp
+            pending = pending[sp <= z[kp, pending]]
+        k += 1
+        v[k, everywhere] = q
+        z[k, everywhere] = s
+        top_z = s
+
+    # Every position falls in the envelope segment given by the number of breakpoints z[1..k] below it, counted by
+    # adding up, down every column, the breakpoints each position is the first one above.
+    line_of = numpy.repeat(everywhere, k)
+    segment = numpy.arange(len(line_of)) - numpy.repeat(numpy.cumsum(k) - k, k) + 1
+    first_above = numpy.clip(numpy.floor(z[segment, line_of]) + 1, 0, n).astype(numpy.int64)
+    j = numpy.bincount(first_above * lines + line_of, minlength=(n + 1) * lines).reshape(n + 1, lines)[:n]
+    numpy.cumsum(j, axis=0, out=j)
+    vj = v[j, everywhere]
+    return (positions[:, None] - vj) ** 2 + f[vj, everywhere]
+
+
+def squared_distances(sites: numpy.ndarray, border_is_site: bool = False) -> numpy.ndarray:
+    """Squared Euclidean distance from every pixel of (..., height, width) boolean frames to the nearest site pixel
+    of its frame, inf in frames without sites. With border_is_site, the pixels just outside the frame count as
+    sites too."""
+    if border_is_site:
+        padded = numpy.ones(sites.shape[:-2] + (sites.shape[-2] + 2, sites.shape[-1] + 2), dtype=bool)
+        padded[..., 1:-1, 1:-1] = sites
+        return squared_distances(padded)[..., 1:-1, 1:-1]
+    shape = sites.shape
+    frames = sites.reshape((-1,) + shape[-2:])
+    # Distances along the rows first, then the envelope down the columns of all frames side by side.
+    f = numpy.moveaxis(_line_distances(frames), 0, 1).reshape(shape[-2], -1)
+    return numpy.moveaxis(_envelope(f).reshape(shape[-2], -1, shape[-1]), 1, 0).reshape(shape)
+
+
+def distance_field(bits: numpy.ndarray, width: int, signed: bool = False) -> numpy.ndarray:
+    """Euclidean distance from every black pixel of packed bitmaps to the nearest white pixel, in pixels. White
+    pixels are at 0, or with signed at minus the distance to the nearest black pixel. Frames without pixels of the
+    other color are at the length of the frame diagonal."""
+    pixels = unpack_bits(bits, width).astype(bool)
+    field = numpy.sqrt(squared_distances(pixels))
+    if signed:
+        field[pixels] = -numpy.sqrt(squared_distances(~pixels)[pixels])
+    diagonal = numpy.hypot(pixels.shape[-2], pixels.shape[-1])
+    return numpy.clip(field, -diagonal, diagonal).astype(numpy.float32)
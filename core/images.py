@@ -1,21 +1,23 @@
 # -*- coding: utf-8 -*-
 import re
 from functools import cache
+from typing import TYPE_CHECKING
 
 import numpy
-import torch
 from PIL import Image, ImageFilter, ImageEnhance, ImageOps, ImageColor
 from PIL.ImageDraw import ImageDraw
-from torch import Tensor
 from .vector import *
 
-from comfy.utils import common_upscale, ProgressBar
+# torch is imported where tensors are made, so registering the nodes does not load it.
+if TYPE_CHECKING:
+    from torch import Tensor
 
 def _convert_tensor_image_to_pil(tensor_image) -> Image:
     return Image.fromarray(numpy.clip(255. * tensor_image.cpu().numpy().squeeze(), 0, 255).astype(numpy.uint8))
 
 
 def _convert_from_pil_to_tensor_old(pil_image):
+    import torch
     return torch.from_numpy(numpy.array(pil_image).astype(numpy.float32) / 255.0)
 
 
@@ -122,13 +124,14 @@ class Painter_Image:
             return t
         image_tensors = [_to_tensor(image) for image in images]
 
+        import torch
         tensor = torch.stack(image_tensors)
         assert len(tensor) == len(images)
 
         return tensor
 
     @classmethod
-    def images_from_tensor_data(cls, tensor: Tensor):
+    def images_from_tensor_data(cls, tensor: "Tensor"):
         return [Painter_Image(tensor_image=data) for data in tensor]
 
     @property
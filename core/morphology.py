@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import math
+
+import numpy
+
+from .bitpack import packed_stride, clear_padding, pack_bits, unpack_bits
+from .distance import squared_distances
+
+# Binary morphology on packed (..., rows, row bytes) bitmaps. Pixels outside the bitmap count as background, so
+# dilation never grows in from the border and erosion eats in from it. Every step combines whole packed rows with
+# bit-shifted copies of themselves, 8 pixels per byte. Line segments grow by doubling - a segment of radius s
+# combined with copies shifted by up to 2s + 1 is a contiguous segment again - so a segment of radius r takes
+# O(log r) shifts. A disc takes a segment per row offset, O(r) steps, so large discs are found from the distance
+# transform instead: a pixel is within radius r of a white pixel when its squared distance to one is at most r * r.
+
+ELEMENT_SQUARE = "square"
+ELEMENT_CROSS = "cross"
+ELEMENT_DISC = "disc"
+ELEMENTS = [ELEMENT_SQUARE, ELEMENT_CROSS, ELEMENT_DISC]
+
+# Discs of a larger radius are dilated and eroded through the distance transform, which costs about as much as the
+# row offsets of a disc of this radius.
+_DISC_DISTANCE_RADIUS = 384
+
+EDGE_INNER = "inner"
+EDGE_OUTER = "outer"
+EDGE_BOTH = "both"
+EDGE_MODES = [EDGE_INNER, EDGE_OUTER, EDGE_BOTH]
+
+
+def _shifted_columns(bits: numpy.ndarray, dx: int) -> numpy.ndarray:
+    """Moves every row dx pixels towards higher x (lower for negative dx), filling with zeros."""
+    out = numpy.zeros_like(bits)
+    n = bits.shape[-1]
+    byte, bit = divmod(abs(dx), 8)
+    if byte >= n:
+        return out
+    if dx >= 0:
+        src, dst = bits[..., :n - byte], out[..., byte:]
+        if bit:
+            dst[...] = src >> bit
+            dst[..., 1:] |= src[..., :-1] << (8 - bit)
+        else:
+            dst[...] = src
+    else:
+        src, dst = bits[..., byte:], out[..., :n - byte]
+        if bit:
+            dst[...] = src << bit
+            dst[..., :-1] |= src[..., 1:] >> (8 - bit)
+        else:
+            dst[...] = src
+    return out
+
+
+def _shifted_rows(bits: numpy.ndarray, dy: int) -> numpy.ndarray:
+    """Moves the rows dy rows down (up for negative dy), filling with zeros."""
+    if dy == 0:
+        return bits
+    out = numpy.zeros_like(bits)
+    if abs(dy) >= bits.shape[-2]:
+        return out
+    if dy > 0:
+        out[..., dy:, :] = bits[..., :-dy, :]
+    else:
+        out[..., :dy, :] = bits[..., -dy:, :]
+    return out
+
+
+def _grow_segment(bits: numpy.ndarray, radius: int, target: int, shift, op) -> numpy.ndarray:
+    """Grows a horizontal or vertical segment element from radius to target."""
+    while radius < target:
+        k = min(2 * radius + 1, target - radius)
+        bits = op(op(bits, shift(bits, k)), shift(bits, -k))
+        radius += k
+    return bits
+
+
+def _apply(bits: numpy.ndarray, radius: int, element: str, op) -> numpy.ndarray:
+    if element == ELEMENT_SQUARE:
+        rows = _grow_segment(bits, 0, radius, _shifted_columns, op)
+        return _grow_segment(rows, 0, radius, _shifted_rows, op)
+    if element == ELEMENT_CROSS:
+        return op(_grow_segment(bits, 0, radius, _shifted_columns, op),
+                  _grow_segment(bits, 0, radius, _shifted_rows, op))
+    if element == ELEMENT_DISC:
+        # A disc is the union of horizontal segments, one per row offset, that widen towards the center row.
+        segment, segment_radius, result = bits, 0, None
+        for dy in range(radius, -1, -1):
+            segment = _grow_segment(segment, segment_radius, math.isqrt(radius * radius - dy * dy),
+                                    _shifted_columns, op)
+            segment_radius = math.isqrt(radius * radius - dy * dy)
+            for moved in ((_shifted_rows(segment, dy), _shifted_rows(segment, -dy)) if dy else (segment,)):
+                result = moved if result is None else op(result, moved)
+        return result
+    raise Exception("Unknown structuring element - " + str(element))
+
+
+def _disc_by_distance(bits: numpy.ndarray, width: int, operation: str, radius: int) -> numpy.ndarray:
+    """Dilates or erodes packed bitmaps with a disc, through the squared distances to the nearest white (dilate) or
+    black (erode) pixel. The pixels around the bitmap are black, so they are sites for the erosion."""
+    pixels = unpack_bits(bits, width).astype(bool)
+    if operation == "dilate":
+        return pack_bits(squared_distances(pixels) <= radius * radius)
+    return pack_bits(squared_distances(~pixels, border_is_site=True) > radius * radius)
+
+
+def morphology(bits: numpy.ndarray, width: int, operation: str, radius: int,
+               element: str = ELEMENT_SQUARE) -> numpy.ndarray:
+    """Dilates, erodes, opens or closes packed bitmaps with a square, cross or disc element of the given radius."""
+    radius = int(radius)
+    if radius <= 0:
+        return bits.copy()
+    if operation == "open":
+        return morphology(morphology(bits, width, "erode", radius, element), width, "dilate", radius, element)
+    if operation == "close":
+        return morphology(morphology(bits, width, "dilate", radius, element), width, "erode", radius, element)
+    if operation not in ("dilate", "erode"):
+        raise Exception("Unknown morphology operation - " + str(operation))
+    if element == ELEMENT_DISC and radius > _DISC_DISTANCE_RADIUS:
+        return _disc_by_distance(bits, width, operation, radius)
+    op = numpy.bitwise_or if operation == "dilate" else numpy.bitwise_and
+
+    # The bitmap is padded with background, wide enough that nothing shifted out of the bitmap and back in is lost.
+    stride = packed_stride(width)
+    pad_bytes = packed_stride(radius)
+    height = bits.shape[-2]
+    padded = numpy.zeros(bits.shape[:-2] + (height + 2 * radius, stride + 2 * pad_bytes), dtype=numpy.uint8)
+    padded[..., radius:radius + height, pad_bytes:pad_bytes + stride] = bits
+    padded = _apply(padded, radius, element, op)
+    out = numpy.ascontiguousarray(padded[..., radius:radius + height, pad_bytes:pad_bytes + stride])
+    return clear_padding(out, width)
+
+
+def edges(bits: numpy.ndarray, width: int, mode: str, connectivity: int = 8) -> numpy.ndarray:
+    """One pixel wide boundaries of the white areas of packed bitmaps: the white pixels next to a black one (inner),
+    the black pixels next to a white one (outer) or both. Neighbours are the 4 or 8 adjacent pixels."""
+    if connectivity not in (4, 8):
+        raise Exception("Connectivity must be 4 or 8 - " + str(connectivity))
+    element = ELEMENT_SQUARE if connectivity == 8 else ELEMENT_CROSS
+    if mode == EDGE_INNER:
+        return bits & ~morphology(bits, width, "erode", 1, element)
+    if mode == EDGE_OUTER:
+        return morphology(bits, width, "dilate", 1, element) & ~bits
+    if mode == EDGE_BOTH:
+        return morphology(bits, width, "dilate", 1, element) ^ morphology(bits, width, "erode", 1, element)
+    raise Exception("Unknown edge mode - " + str(mode))
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import atexit
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+# Opt-in instrumentation. Nodes and the phases of drawing and conversion are recorded as named spans - wall time,
+# peak traced allocation (when allocation tracking is on) and the size of what they returned - and aggregated per
+# prompt. When profiling is off a span costs a single flag check.
+
+
+def _output_bytes(value) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(_output_bytes(v) for v in value)
+    if hasattr(value, "packed_bits"):
+        value = value.packed_bits
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if hasattr(value, "element_size"):
+        return int(value.nelement() * value.element_size())
+    return 0
+
+
+def _current_prompt_id():
+    try:
+        from server import PromptServer
+        return getattr(PromptServer.instance, "last_prompt_id", None)
+    except Exception:
+        return None
+
+
+class Profiler:
+    """Collects span timings, and reports them aggregated by span name whenever a new prompt starts running."""
+
+    def __init__(self):
+        self.enabled = False
+        self.track_allocations = False
+        self.report_file = ""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._prompt_id = None
+        self._spans = dict()
+        atexit.register(self.report)
+
+    def configure(self, enabled: bool, track_allocations: bool = False, report_file: str = ""):
+        self.enabled = bool(enabled)
+        self.track_allocations = self.enabled and bool(track_allocations)
+        self.report_file = report_file
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _memory_stack(self) -> list:
+        stack = getattr(self._local, "memory", None)
+        if stack is None:
+            stack = self._local.memory = list()
+        return stack
+
+    def _enter(self):
+        if not self.track_allocations:
+            return
+        # The traced peak is global, so it is reset for every span and the peaks of nested spans are carried up.
+        stack = self._memory_stack()
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, current])
+
+    def _exit(self) -> int:
+        if not self.track_allocations:
+            return 0
+        stack = self._memory_stack()
+        if not stack:
+            return 0
+        _, peak = tracemalloc.get_traced_memory()
+        start, highest = stack.pop()
+        highest = max(highest, peak)
+        tracemalloc.reset_peak()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], highest)
+        return highest - start
+
+    def record(self, name: str, seconds: float, peak_bytes: int = 0, output_bytes: int = 0):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                entry = self._spans[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": 0,
+                                             "output_bytes": 0}
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["peak_bytes"] = max(entry["peak_bytes"], peak_bytes)
+            entry["output_bytes"] += output_bytes
+
+    def call(self, name: str, function, *args, **kwargs):
+        """Calls function, recorded as a span of the given name."""
+        self._enter()
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            peak = self._exit()
+        self.record(name, seconds, peak, _output_bytes(result))
+        return result
+
+    def start_prompt(self, prompt_id):
+        """Reports the spans of the previous prompt when another one has started."""
+        if prompt_id != self._prompt_id:
+            self.report()
+            self._prompt_id = prompt_id
+
+    def report(self) -> dict:
+        """Emits and clears the aggregated spans of the current prompt."""
+        with self._lock:
+            spans, self._spans = self._spans, dict()
+        if not spans:
+            return None
+        report = {"prompt_id": self._prompt_id, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "spans": spans}
+        print("[DPaint] Profile of prompt {}".format(self._prompt_id))
+        print("  {:<48} {:>7} {:>10} {:>10} {:>12} {:>12}".format("span", "calls", "total s", "max s", "peak MB",
+                                                                   "output MB"))
+        for name, s in sorted(spans.items(), key=lambda item: -item[1]["seconds"]):
+            print("  {:<48} {:>7} {:>10.4f} {:>10.4f} {:>12.2f} {:>12.2f}".format(
+                name[:48], s["calls"], s["seconds"], s["max_seconds"], s["peak_bytes"] / 1e6,
+                s["output_bytes"] / 1e6))
+        if self.report_file:
+            with open(self.report_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report) + "\n")
+        return report
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: str):
+    """Decorator recording every call of a function as a span, while profiling is on."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            return PROFILER.call(name, function, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profile_node(cls):
+    """Wraps the FUNCTION of a node class, recording each run of the node under the prompt it belongs to."""
+    function = getattr(cls, cls.FUNCTION)
+    name = "node " + cls.NODE_NAME
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return function(*args, **kwargs)
+        PROFILER.start_prompt(_current_prompt_id())
+        return PROFILER.call(name, function, *args, **kwargs)
+
+    setattr(cls, cls.FUNCTION, wrapper)
+    return cls
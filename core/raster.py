@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+from typing import List, Tuple
+
+import numpy
+
+from .bitpack import pack_bits
+
+# Scanline rasterization of filled polygons on packed bitmaps. The spans of each polygon follow the rules of
+# PIL's ImageDraw.polygon (vertices truncated to integers, inclusive spans, horizontal edges drawn as lines and
+# the correction PIL applies at sharp corners), so filling here gives the same pixels as drawing with PIL.
+
+_HALF = numpy.float32(0.5)
+_ONE = numpy.float32(1.0)
+
+
+def _round_up(x: numpy.ndarray) -> numpy.ndarray:
+    return numpy.where(x >= 0, numpy.floor(x + _HALF), -numpy.floor(numpy.abs(x) + _HALF)).astype(numpy.int64)
+
+
+def _round_down(x: numpy.ndarray) -> numpy.ndarray:
+    return numpy.where(x >= 0, numpy.ceil(x - _HALF), -numpy.ceil(numpy.abs(x) - _HALF)).astype(numpy.int64)
+
+
+def _roundf(x: numpy.ndarray) -> numpy.ndarray:
+    t = numpy.trunc(x)
+    return t + numpy.where(numpy.abs(x - t) >= _HALF, numpy.sign(x), 0).astype(x.dtype)
+
+
+def _ranges(starts: numpy.ndarray, counts: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Expands per-item [start, start + count) ranges into (item index, value) pairs."""
+    item = numpy.repeat(numpy.arange(len(counts)), counts)
+    offsets = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return item, starts[item] + numpy.arange(len(item)) - offsets
+
+
+def _group_starts(*keys: numpy.ndarray) -> numpy.ndarray:
+    first = numpy.zeros(len(keys[0]), dtype=bool)
+    if len(first):
+        first[0] = True
+    for k in keys:
+        first[1:] |= k[1:] != k[:-1]
+    return first
+
+
+def _polygon_edges(vertices: numpy.ndarray, counts: numpy.ndarray):
+    """Edge list in the order PIL builds it: consecutive vertices, then a closing edge when needed."""
+    starts = numpy.cumsum(counts) - counts
+    ends = starts + counts - 1
+    poly_of_vertex = numpy.repeat(numpy.arange(len(counts)), counts)
+    follows = numpy.ones(len(vertices), dtype=bool)
+    follows[ends[counts > 0]] = False
+    a = numpy.nonzero(follows)[0]
+    closing = counts > 1
+    closing[closing] = numpy.any(vertices[ends[closing]] != vertices[starts[closing]], axis=1)
+    closing = numpy.nonzero(closing)[0]
+    first = numpy.concatenate([a, ends[closing]])
+    second = numpy.concatenate([a + 1, starts[closing]])
+    poly = numpy.concatenate([poly_of_vertex[a], closing])
+    position = numpy.concatenate([a - starts[poly_of_vertex[a]], counts[closing]])
+    order = numpy.lexsort((position, poly))
+    return poly[order], vertices[first[order]], vertices[second[order]]
+
+
+# Crossings (edge and row pairs) handled at a time. Rows are worked on in chunks of about this many crossings, which
+# bounds the memory of tall and many edged polygons.
+_CHUNK_CROSSINGS = 1 << 18
+
+
+def _truncated_edges(polygons: List[numpy.ndarray]):
+    polygons = [numpy.asarray(p, dtype=numpy.float64).reshape(-1, 2) for p in polygons]
+    counts = numpy.array([len(p) for p in polygons], dtype=numpy.int64)
+    if not len(polygons) or counts.sum() == 0:
+        return None
+    vertices = numpy.trunc(numpy.concatenate(polygons)).astype(numpy.int64)
+    return _polygon_edges(vertices, counts)
+
+
+def _row_crossings(lo: numpy.ndarray, hi: numpy.ndarray, first_row: int, stop_row: int) -> numpy.ndarray:
+    """Number of edges crossing every row of [first_row, stop_row), given the first and last row of every edge."""
+    lo = numpy.clip(lo, first_row, stop_row) - first_row
+    hi = numpy.clip(hi + 1, first_row, stop_row) - first_row
+    keep = hi > lo
+    changes = numpy.bincount(lo[keep], minlength=stop_row - first_row + 1) - \
+        numpy.bincount(hi[keep], minlength=stop_row - first_row + 1)
+    return numpy.cumsum(changes[:-1])
+
+
+def crossing_count(polygons: List[numpy.ndarray], height: int, rows: Tuple[int, int] = None) -> int:
+    """Number of edge and row pairs the scanline pass works through to fill the polygons on a canvas of the given
+    height, or on a [start, stop) range of its rows. Its time grows with this count."""
+    first_row, stop_row = (0, height) if rows is None else rows
+    edges = _truncated_edges(polygons)
+    if edges is None:
+        return 0
+    _, p0, p1 = edges
+    lo = numpy.minimum(p0[:, 1], p1[:, 1])
+    hi = numpy.maximum(p0[:, 1], p1[:, 1])
+    return int(_row_crossings(lo, hi, first_row, stop_row).sum())
+
+
+def _empty_spans():
+    empty = numpy.zeros(0, dtype=numpy.int64)
+    return empty, empty, empty, empty
+
+
+def polygon_span_chunks(polygons: List[numpy.ndarray], width: int, height: int, rows: Tuple[int, int] = None):
+    """Yields (polygon, row, x_start, x_end) arrays with the inclusive spans PIL would fill for every polygon,
+    clipped to the canvas, or to a [start, stop) range of its rows. Every chunk covers a range of rows, in order,
+    and is sorted by polygon, row and start. Spans of one polygon never overlap."""
+    first_row, stop_row = (0, height) if rows is None else rows
+    edges = _truncated_edges(polygons)
+    if edges is None:
+        return
+    poly, p0, p1 = edges
+
+    edge_ymin = numpy.minimum(p0[:, 1], p1[:, 1])
+    edge_ymax = numpy.maximum(p0[:, 1], p1[:, 1])
+    poly_ymin = numpy.full(len(polygons), height - 1, dtype=numpy.int64)
+    numpy.minimum.at(poly_ymin, poly, edge_ymin)
+    poly_ymin = numpy.maximum(poly_ymin, 0)
+    poly_ymax = numpy.zeros(len(polygons), dtype=numpy.int64)
+    numpy.maximum.at(poly_ymax, poly, edge_ymax)
+    poly_ymax = numpy.minimum(poly_ymax, height)
+
+    horizontal = edge_ymin == edge_ymax
+    h_poly = poly[horizontal]
+    h_row = edge_ymin[horizontal]
+    h_start = numpy.minimum(p0[horizontal, 0], p1[horizontal, 0])
+    h_end = numpy.maximum(p0[horizontal, 0], p1[horizontal, 0])
+
+    sloped = ~horizontal
+    e_poly = poly[sloped]
+    x0, y0 = p0[sloped, 0], p0[sloped, 1]
+    x1, y1 = p1[sloped, 0], p1[sloped, 1]
+    e_ymin = edge_ymin[sloped]
+    e_ymax = edge_ymax[sloped]
+    dx = (x1 - x0).astype(numpy.float32) / (y1 - y0).astype(numpy.float32)
+    x0f = x0.astype(numpy.float32)
+    lo = numpy.maximum(e_ymin, poly_ymin[e_poly])
+    hi = numpy.minimum(e_ymax, poly_ymax[e_poly])
+
+    # Chunks of rows that each hold about _CHUNK_CROSSINGS crossings, and at least one row.
+    per_row = _row_crossings(lo, hi, first_row, stop_row)
+    total = numpy.cumsum(per_row)
+    ends = numpy.searchsorted(total, numpy.arange(1, int(total[-1]) // _CHUNK_CROSSINGS + 1) * _CHUNK_CROSSINGS,
+                              side="right") if len(total) else numpy.zeros(0, dtype=numpy.int64)
+    bounds = numpy.unique(numpy.concatenate([[first_row], first_row + numpy.maximum(ends, 1), [stop_row]]))
+    bounds = bounds[(bounds >= first_row) & (bounds <= stop_row)]
+    for chunk_start, chunk_stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        crossing = (lo < chunk_stop) & (hi >= chunk_start)
+        in_chunk = (h_row >= chunk_start) & (h_row < chunk_stop)
+        spans = _chunk_spans(width, chunk_start, chunk_stop, poly_ymax, e_poly[crossing], x0f[crossing],
+                             y0[crossing], dx[crossing], e_ymin[crossing], e_ymax[crossing],
+                             numpy.maximum(lo[crossing], chunk_start), numpy.minimum(hi[crossing], chunk_stop - 1),
+                             h_poly[in_chunk], h_row[in_chunk], h_start[in_chunk], h_end[in_chunk])
+        if len(spans[0]):
+            yield spans
+
+
+def _chunk_spans(width, first_row, stop_row, poly_ymax, e_poly, x0f, y0, dx, e_ymin, e_ymax, lo, hi,
+                 h_poly, h_row, h_start, h_end):
+    edge, row = _ranges(lo, numpy.maximum(hi - lo + 1, 0))
+    xx = (row - y0[edge]).astype(numpy.float32) * dx[edge] + x0f[edge]
+
+    at_min = row == e_ymin[edge]
+    at_end = (at_min | (row == e_ymax[edge])) & (dx[edge] != 0)
+    duplicate = (row == e_ymax[edge]) & (row < poly_ymax[e_poly[edge]])
+    # PIL nudges the crossing at a corner where two edges meet on the same pixel, using the first such edge.
+    ends = numpy.nonzero(at_end)[0]
+    if len(ends):
+        rounded = _roundf(xx[ends])
+        order = numpy.lexsort((edge[ends], at_min[ends], rounded, row[ends], e_poly[edge[ends]]))
+        ends, rounded = ends[order], rounded[order]
+        first = _group_starts(e_poly[edge[ends]], row[ends], rounded, at_min[ends])
+        other = edge[ends][numpy.maximum.accumulate(numpy.where(first, numpy.arange(len(ends)), 0))]
+        corner = (other < edge[ends]) & ~duplicate[ends]
+        ends, other = ends[corner], other[corner]
+        current = edge[ends]
+        adjacent_row = row[ends] + numpy.where(at_min[ends], 1, -1)
+        adjacent = (adjacent_row - y0[current]).astype(numpy.float32) * dx[current] + x0f[current]
+        adjacent_other = (adjacent_row - y0[other]).astype(numpy.float32) * dx[other] + x0f[other]
+        x = xx[ends]
+        above = (x > adjacent + _ONE) & (x > adjacent_other + _ONE)
+        below = ~above & (x < adjacent - _ONE) & (x < adjacent_other - _ONE)
+        x = numpy.where(above, _roundf(numpy.maximum(adjacent, adjacent_other)) + _ONE, x)
+        x = numpy.where(below, _roundf(numpy.minimum(adjacent, adjacent_other)) - _ONE, x)
+        xx[ends] = x
+
+    c_poly = numpy.concatenate([e_poly[edge], e_poly[edge[duplicate]]])
+    c_row = numpy.concatenate([row, row[duplicate]])
+    c_x = numpy.concatenate([xx, xx[duplicate]])
+    order = numpy.lexsort((c_x, c_row, c_poly))
+    c_poly, c_row, c_x = c_poly[order], c_row[order], c_x[order]
+    group = numpy.cumsum(_group_starts(c_poly, c_row)) - 1
+    position = numpy.arange(len(c_x)) - numpy.searchsorted(group, group)
+    left = numpy.nonzero((position % 2 == 0) & (numpy.append(group[1:], -1) == group))[0]
+
+    s_poly = numpy.concatenate([c_poly[left], h_poly])
+    s_row = numpy.concatenate([c_row[left], h_row])
+    s_start = numpy.concatenate([_round_up(c_x[left]), h_start])
+    s_end = numpy.concatenate([_round_down(c_x[left + 1]), h_end])
+
+    s_start = numpy.maximum(s_start, 0)
+    s_end = numpy.minimum(s_end, width - 1)
+    keep = (s_row >= first_row) & (s_row < stop_row) & (s_start <= s_end)
+    s_poly, s_row, s_start, s_end = s_poly[keep], s_row[keep], s_start[keep], s_end[keep]
+    if not len(s_row):
+        return _empty_spans()
+
+    # Spans of a single polygon may touch or overlap (shared vertices, horizontal edges), merge them.
+    order = numpy.lexsort((s_start, s_row, s_poly))
+    s_poly, s_row, s_start, s_end = s_poly[order], s_row[order], s_start[order], s_end[order]
+    group = numpy.cumsum(_group_starts(s_poly, s_row)) - 1
+    reach = numpy.maximum.accumulate(group * (width + 1) + s_end) - group * (width + 1)
+    new = numpy.ones(len(s_start), dtype=bool)
+    new[1:] = (group[1:] != group[:-1]) | (s_start[1:] > reach[:-1])
+    begin = numpy.nonzero(new)[0]
+    last = numpy.append(begin[1:], len(s_start)) - 1
+    return s_poly[begin], s_row[begin], s_start[begin], reach[last]
+
+
+def polygon_spans(polygons: List[numpy.ndarray], width: int, height: int, rows: Tuple[int, int] = None):
+    """Returns (polygon, row, x_start, x_end) arrays with the inclusive spans PIL would fill for every polygon,
+    clipped to the canvas, or to a [start, stop) range of its rows, sorted by polygon, row and start. Spans of one
+    polygon never overlap."""
+    chunks = list(polygon_span_chunks(polygons, width, height, rows))
+    if not chunks:
+        return _empty_spans()
+    s_poly, s_row, s_start, s_end = (numpy.concatenate(parts) for parts in zip(*chunks))
+    # Chunks are in row order, so a stable sort by polygon keeps rows and starts in order.
+    order = numpy.argsort(s_poly, kind="stable")
+    return s_poly[order], s_row[order], s_start[order], s_end[order]
+
+
+def fill_polygons_xor(bits: numpy.ndarray, width: int, polygons: List[numpy.ndarray], first_row: int = 0,
+                      height: int = None):
+    """XORs the fill of every polygon into a packed (rows, row bytes) bitmap, in place. The bitmap holds the rows
+    from first_row and on of a canvas that is height rows high (by default, as high as the bitmap reaches)."""
+    if height is None:
+        height = first_row + bits.shape[0]
+    for _, row, start, end in polygon_span_chunks(polygons, width, height, (first_row, first_row + bits.shape[0])):
+        _xor_spans(bits, width, row - first_row, start, end)
+    return bits
+
+
+def _xor_spans(bits: numpy.ndarray, width: int, row: numpy.ndarray, start: numpy.ndarray, end: numpy.ndarray):
+    toggles = numpy.concatenate([row * (width + 1) + start, row * (width + 1) + end + 1])
+    positions, hits = numpy.unique(toggles, return_counts=True)
+    positions = positions[(hits & 1) == 1]
+    if not len(positions):
+        return
+    first_row = int(positions[0] // (width + 1))
+    last_row = int(positions[-1] // (width + 1))
+    parity = numpy.zeros((last_row - first_row + 1, width + 1), dtype=numpy.uint8)
+    parity.flat[positions - first_row * (width + 1)] = 1
+    numpy.cumsum(parity, axis=1, dtype=numpy.uint8, out=parity)
+    bits[first_row:last_row + 1] ^= pack_bits(parity[:, :width] & 1)
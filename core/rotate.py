@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import math
+from typing import Optional, Tuple
+
+import numpy
+
+from .bitpack import pack_bits, unpack_bits, transpose_bits
+
+# Rotation of packed bitmaps by multiples of 90 degrees, with the same pixels as PIL's Image.rotate on mode "1" images.
+# The inverse matrix and output size are computed as PIL computes them, and the source of the first output pixel is
+# found as PIL's C code would find it: by plain scaling when the matrix has no rotation part, else in 16.16 fixed point
+# when all coordinates fit, else in floating point. Such rotations map whole rows and columns onto each other and are
+# done by slicing. Other angles are left to PIL, which is faster at sampling them.
+
+
+def _inverse_matrix(width: int, height: int, center_x, center_y, degrees: float, expand: bool):
+    angle = -math.radians(degrees % 360.0)
+    matrix = [round(math.cos(angle), 15), round(math.sin(angle), 15), 0.0,
+              round(-math.sin(angle), 15), round(math.cos(angle), 15), 0.0]
+
+    def transform(x, y):
+        a, b, c, d, e, f = matrix
+        return a * x + b * y + c, d * x + e * y + f
+
+    matrix[2], matrix[5] = transform(-center_x, -center_y)
+    matrix[2] += center_x
+    matrix[5] += center_y
+    if expand:
+        xx, yy = zip(*[transform(x, y) for x, y in ((0, 0), (width, 0), (width, height), (0, height))])
+        new_width = math.ceil(max(xx)) - math.floor(min(xx))
+        new_height = math.ceil(max(yy)) - math.floor(min(yy))
+        matrix[2], matrix[5] = transform(-(new_width - width) / 2.0, -(new_height - height) / 2.0)
+        width, height = new_width, new_height
+    return matrix, width, height
+
+
+def _fits_fixed(a, width: int, height: int) -> bool:
+    return all(abs(x * a[0] + y * a[1] + a[2]) < 32768.0 and abs(x * a[3] + y * a[4] + a[5]) < 32768.0
+               for x, y in ((0, 0), (width, height), (0, height), (width, 0)))
+
+
+def _fixed(v: float) -> int:
+    return math.floor(v * 65536.0 + 0.5)
+
+
+def _axis_steps(a, path: str):
+    """For matrices that only swap and mirror axes: the source (row, column) of output pixel (0, 0) and how they
+    step per output column and row, or None."""
+    if any(v not in (0.0, 1.0, -1.0) for v in (a[0], a[1], a[3], a[4])):
+        return None
+    if path == "scale":
+        column, row = math.floor(a[2] + a[0] * 0.5), math.floor(a[5] + a[4] * 0.5)
+    elif path == "fixed":
+        column = _fixed(a[2] + a[0] * 0.5 + a[1] * 0.5) >> 16
+        row = _fixed(a[5] + a[3] * 0.5 + a[4] * 0.5) >> 16
+    elif abs(a[2]) < 2 ** 40 and abs(a[5]) < 2 ** 40:
+        # Small enough that adding up the steps is exact, as it is in the other paths.
+        column = math.floor(a[2] + a[1] * 0.5 + a[0] * 0.5)
+        row = math.floor(a[5] + a[4] * 0.5 + a[3] * 0.5)
+    else:
+        return None
+    return row, column, (int(a[3]), int(a[0])), (int(a[4]), int(a[1]))
+
+
+def _slice_range(start: int, step: int, count: int, size: int):
+    """The output range [lo, hi) where start + step * i is inside [0, size), and the matching source slice."""
+    if step == 0:
+        return (0, count, slice(None)) if 0 <= start < size else (0, 0, slice(0, 0))
+    if step > 0:
+        lo, hi = max(0, -start), min(count, size - start)
+    else:
+        lo, hi = max(0, start - size + 1), min(count, start + 1)
+    if hi <= lo:
+        return 0, 0, slice(0, 0)
+    first = start + step * lo
+    last = start + step * (hi - 1)
+    return lo, hi, slice(first, last + step if last + step >= 0 else None, step)
+
+
+def rotate_bits(bits: numpy.ndarray, width: int, center_x, center_y, degrees: float, expand: bool = True,
+                fill: int = 0) -> Optional[Tuple[numpy.ndarray, int]]:
+    """Rotates packed (frames, rows, row bytes) bitmaps counter-clockwise around a center, as PIL would. Returns the
+    rotated bits and their width, or None for angles that are not a multiple of 90 degrees."""
+    height = bits.shape[-2]
+    a, out_width, out_height = _inverse_matrix(width, height, center_x, center_y, degrees, expand)
+    if a[1] == 0 and a[3] == 0:
+        path = "scale"
+    elif _fits_fixed(a, out_width, out_height):
+        path = "fixed"
+    else:
+        path = "float"
+    steps = _axis_steps(a, path)
+    if steps is None:
+        return None
+
+    out = numpy.full((bits.shape[0], out_height, out_width), 1 if fill else 0, dtype=numpy.uint8)
+    row0, column0, (row_per_x, row_per_y), (column_per_x, column_per_y) = steps
+    if row_per_x or column_per_y:
+        # Source rows follow output columns and source columns follow output rows.
+        source = unpack_bits(transpose_bits(bits, width), height)
+        row0, column0 = column0, row0
+        row_per_y, column_per_x = column_per_y, row_per_x
+    else:
+        source = unpack_bits(bits, width)
+    y0, y1, rows = _slice_range(row0, row_per_y, out_height, source.shape[-2])
+    x0, x1, columns = _slice_range(column0, column_per_x, out_width, source.shape[-1])
+    if y1 > y0 and x1 > x0:
+        out[:, y0:y1, x0:x1] = source[:, rows, columns]
+    return pack_bits(out), out_width
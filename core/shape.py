@@ -1,77 +1,172 @@
-from typing import List, Tuple
+import hashlib
+import math
+from typing import List, Tuple, Iterator
 
+import numpy
 from typing_extensions import Self
 
-from .vector import Vector2d
+from .vector import Vector2d, rotate_points, affine_identity, affine_translation, affine_scale, affine_rotation, \
+    affine_flip, is_axis_aligned, apply_affine, affine_bounds
 from .bitcanvas import BitCanvas
+from .profiling import profiled
+
+
+_DEFAULT_BOUNDS = numpy.array([0.0, 0.0, 1.0, 1.0])
+_IDENTITY = affine_identity()
+
+# Instances are transformed in chunks, to bound the memory of the transformed vertices.
+_INSTANCE_CHUNK = 65536
+_CHUNK_POINTS = 1 << 20
+
+
+def _digest(tag: str, *arrays: numpy.ndarray, parts: List[str] = ()) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    h.update(tag.encode("utf-8"))
+    for a in arrays:
+        h.update("{}{};".format(a.dtype.str, a.shape).encode("utf-8"))
+        h.update(numpy.ascontiguousarray(a).data)
+    for p in parts:
+        h.update(p.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _as_points(vectors) -> numpy.ndarray:
+    if isinstance(vectors, numpy.ndarray):
+        return vectors.astype(numpy.float64, copy=False).reshape(-1, 2)
+    return numpy.array([(v.x, v.y) for v in vectors], dtype=numpy.float64).reshape(-1, 2)
 
 
 class ShapeContent:
     TYPE_POLYGON = "POLYGON"
     TYPE_LINE = "LINE"
 
-    def __init__(self, vectors: List[Vector2d], tp: str):
-        self._vectors = vectors
+    def __init__(self, vectors: List[Vector2d] | numpy.ndarray, tp: str, bounds: numpy.ndarray = None):
+        self._points = _as_points(vectors)
         self._tp = tp
+        self._bounds = bounds
+        self._fingerprint = None
+
+    @property
+    def points(self) -> numpy.ndarray:
+        return self._points
+
+    @property
+    def type(self) -> str:
+        return self._tp
+
+    def fingerprint(self) -> str:
+        """A hash of the type and vertices, kept until the content is transformed."""
+        if self._fingerprint is None:
+            self._fingerprint = _digest("content:" + self._tp, self._points)
+        return self._fingerprint
+
+    @property
+    def vectors(self) -> List[Vector2d]:
+        return [Vector2d(x, y) for x, y in self._points.tolist()]
 
     def dimensions(self) -> Tuple[float, float]:
         a, b = self.get_bounds()
         return (b.x - a.x, b.y - a.y)
 
     def get_bounds(self) -> Tuple[Vector2d, Vector2d]:
-        if self._vectors:
-            min_x = min(map(lambda v: v.x, self._vectors))
-            max_x = max(map(lambda v: v.x, self._vectors))
-            min_y = min(map(lambda v: v.y, self._vectors))
-            max_y = max(map(lambda v: v.y, self._vectors))
-            return (Vector2d(min_x, min_y), Vector2d(max_x, max_y))
-        else:
-            return (Vector2d(0, 0), Vector2d(1, 1))
+        min_x, min_y, max_x, max_y = self.bounds_under().tolist()
+        return (Vector2d(min_x, min_y), Vector2d(max_x, max_y))
+
+    def local_bounds(self) -> numpy.ndarray:
+        if self._bounds is None:
+            if len(self._points):
+                self._bounds = numpy.concatenate([self._points.min(axis=0), self._points.max(axis=0)])
+            else:
+                self._bounds = _DEFAULT_BOUNDS
+        return self._bounds
+
+    def bounds_under(self, transform: numpy.ndarray = None) -> numpy.ndarray:
+        if transform is None:
+            return self.local_bounds()
+        if not len(self._points):
+            return _DEFAULT_BOUNDS
+        if is_axis_aligned(transform):
+            return affine_bounds(self.local_bounds(), transform)
+        points = apply_affine(self._points, transform)
+        return numpy.concatenate([points.min(axis=0), points.max(axis=0)])
+
+    def transformed_points(self, transform: numpy.ndarray = None) -> numpy.ndarray:
+        if transform is None:
+            return self._points
+        return apply_affine(self._points, transform)
 
     def copy(self) -> Self:
-        return ShapeContent(self._vectors, self._tp)
+        # Transforms replace the point array instead of modifying it, so copies can share it.
+        return ShapeContent(self._points, self._tp, self._bounds)
 
     def _check_viewport(self, viewport: Tuple[Vector2d, Vector2d]):
         if (viewport[1].x <= viewport[0].x or viewport[1].y <= viewport[0].y):
             raise Exception("Bad viewport! " + str(viewport))
 
     def draw_normal(self, bitcanvas: BitCanvas, fill: bool = True, line_width: float = 1,
-                    viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1))):
+                    viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1)),
+                    transform: numpy.ndarray = None):
         bitcanvas.set_color(BitCanvas.COLOR_WHITE)
         bitcanvas.set_fill(fill)
-        self._check_viewport(viewport)
+        r = self.canvas_polygon(bitcanvas, viewport, transform)
+        if not bitcanvas.touches_rows(r, line_width):
+            return
         if self._tp == ShapeContent.TYPE_LINE:
-            a = bitcanvas.multiply_vector_with_dimensions(self._vectors[0], viewport)
-            b = bitcanvas.multiply_vector_with_dimensions(self._vectors[1], viewport)
-            bitcanvas.line((a.as_tuple(), b.as_tuple()), width=line_width)
+            bitcanvas.polyline(r[:2].ravel().tolist(), line_width)
         elif self._tp == ShapeContent.TYPE_POLYGON:
-            r = list()
-            for v in self._vectors:
-                r.append(bitcanvas.multiply_vector_with_dimensions(v, viewport).as_tuple())
             if fill:
-                bitcanvas.polygon(r)
+                bitcanvas.polygon(r.ravel().tolist())
             else:
-                l = list()
-                for i in range(len(r) + 1):
-                    l.append(r[(i) % len(r)])
-                bitcanvas.polyline(l, line_width)
+                bitcanvas.polyline(numpy.concatenate([r, r[:1]]).ravel().tolist(), line_width)
         bitcanvas.set_color(BitCanvas.COLOR_WHITE)
 
+    @profiled("ShapeContent.canvas_polygon")
+    def canvas_polygon(self, bitcanvas: BitCanvas,
+                       viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1)),
+                       transform: numpy.ndarray = None) -> numpy.ndarray:
+        self._check_viewport(viewport)
+        return bitcanvas.map_to_canvas(self.transformed_points(transform), viewport)
+
     def draw_xor(self, bitcanvas: BitCanvas, fill: bool = True, line_width: float = 1,
-                 viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1))):
-        cp = bitcanvas.clear_copy()
-        self.draw_normal(cp, fill, line_width, viewport)
-        bitcanvas.combine_xor(cp)
+                 viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1)),
+                 transform: numpy.ndarray = None):
+        r = self.canvas_polygon(bitcanvas, viewport, transform)
+        if not bitcanvas.touches_rows(r, line_width):
+            return
+        if fill and self._tp == ShapeContent.TYPE_POLYGON:
+            bitcanvas.polygons_xor([r])
+            return
+        # Drawn on a canvas of just the band of rows the content covers, which is all that is XOR:ed back.
+        cp = bitcanvas.band_copy(r, int(math.ceil(line_width)))
+        if cp is None:
+            return
+        self.draw_normal(cp, fill, line_width, viewport, transform)
+        bitcanvas.combine_xor_band(cp)
 
     def apply_vector_op(self, op) -> Self:
-        l = list(map(op, self._vectors))
-        self._vectors = l
+        self._points = _as_points([op(v) for v in self.vectors])
+        self._bounds = None
+        self._fingerprint = None
+        return self
+
+    def apply_points_op(self, op) -> Self:
+        self._points = _as_points(op(self._points))
+        self._bounds = None
+        self._fingerprint = None
         return self
 
+    def _update_bounds(self, transform: numpy.ndarray, bounds: numpy.ndarray):
+        """Carries cached bounds over an axis aligned transform, as long as there are points to bound."""
+        if bounds is not None and len(self._points):
+            self._bounds = affine_bounds(bounds, transform)
+
     def scale(self, factor_x, factor_y=None) -> Self:
         if factor_y is None:
             factor_y = factor_x
-        return self.apply_vector_op(lambda v: Vector2d(v.x * factor_x, v.y * factor_y))
+        bounds = self._bounds
+        self.apply_points_op(lambda p: p * (factor_x, factor_y))
+        self._update_bounds(affine_scale(factor_x, factor_y), bounds)
+        return self
 
     def center(self) -> Vector2d:
         bound = self.get_bounds()
@@ -84,30 +179,25 @@ class ShapeContent:
         self.translate(0.5 - c.x, 0.5 - c.y)
 
     def translate(self, x, y):
-        self.apply_vector_op(lambda v: Vector2d(v.x + x, v.y + y))
+        bounds = self._bounds
+        self.apply_points_op(lambda p: p + (x, y))
+        self._update_bounds(affine_translation(x, y), bounds)
 
     def rotate(self, center: Vector2d, degrees: float):
-        def _r(v: Vector2d):
-            a = v.sub(center)
-            return center.add(a.rotate(degrees))
-
-        self.apply_vector_op(_r)
+        self.apply_points_op(lambda p: rotate_points(p - (center.x, center.y), degrees) + (center.x, center.y))
 
     def flip(self, horizontal: bool, vertical: bool, center: Vector2d):
-        def _flip_x(v: Vector2d, cx: float):
-            return Vector2d(cx + cx - v.x, v.y)
-
-        def _flip_y(v: Vector2d, cy: float):
-            return Vector2d(v.x, cy + cy - v.y)
-
-        if horizontal and vertical:
-            return self.apply_vector_op(lambda v: _flip_x(_flip_y(v, center.y), center.x))
-        elif horizontal:
-            return self.apply_vector_op(lambda v: _flip_x(v, center.x))
-        elif vertical:
-            return self.apply_vector_op(lambda v: _flip_y(v, center.y))
-        else:
+        if not horizontal and not vertical:
             return self
+        points = self._points.copy()
+        if horizontal:
+            points[:, 0] = (center.x + center.x) - points[:, 0]
+        if vertical:
+            points[:, 1] = (center.y + center.y) - points[:, 1]
+        self._points = points
+        self._fingerprint = None
+        self._update_bounds(affine_flip(horizontal, vertical, center), self._bounds)
+        return self
 
     def __str__(self):
         b = self.get_bounds()
@@ -115,41 +205,86 @@ class ShapeContent:
 
 
 class Shape:
+    """A composite of shape contents and other shapes. Transforms are not applied to the contents, they are
+    collected in an affine matrix that is used when bounds are calculated and when the shape is drawn. The
+    contents are never modified, so copies of a shape share them, along with their cached bounds. The combined
+    matrix rounds differently than transforming the vertices one step at a time would, so a vertex can end up a unit
+    in the last place away, which changes the odd pixel where it lands right on a pixel boundary."""
     TYPE_NAME = "SHAPE"
 
-    def __init__(self, content: List[ShapeContent | Self]):
-        self._content = list(content)
+    def __init__(self, content: List[ShapeContent | Self | "ShapeInstances"], transform: numpy.ndarray = None):
+        # Sub shapes are snapshotted, transforming them later must not change this shape or its cached bounds.
+        self._content = tuple(c.copy() if isinstance(c, Shape) else c for c in content)
+        self._transform = affine_identity() if transform is None else transform
+        self._content_bounds = None
+        self._bounds = None
+        self._fingerprint = None
 
     def copy(self) -> Self:
-        l = list()
-        for c in self._content:
-            l.append(c.copy())
-        return Shape(l)
+        s = Shape((), self._transform)
+        s._content = self._content
+        s._content_bounds = self._content_bounds
+        s._bounds = self._bounds
+        s._fingerprint = self._fingerprint
+        return s
+
+    @property
+    def transform(self) -> numpy.ndarray:
+        return self._transform
+
+    @property
+    def contents(self) -> Tuple[ShapeContent | Self, ...]:
+        return self._content
+
+    def fingerprint(self) -> str:
+        """A hash of the structure, transform and contents of the shape, kept until the shape is transformed. Since
+        the contents are shared and never modified, their own fingerprints are reused."""
+        if self._fingerprint is None:
+            self._fingerprint = _digest("shape:{};".format(len(self._content)), self._transform,
+                                        parts=[c.fingerprint() for c in self._content])
+        return self._fingerprint
+
+    def _apply_transform(self, transform: numpy.ndarray):
+        self._transform = transform @ self._transform
+        self._fingerprint = None
+        if self._bounds is not None and self._content and is_axis_aligned(transform):
+            self._bounds = affine_bounds(self._bounds, transform)
+        else:
+            self._bounds = None
 
     def dimensions(self) -> Tuple[float, float]:
         a, b = self.get_bounds()
         return (b.x - a.x, b.y - a.y)
 
     def get_bounds(self) -> Tuple[Vector2d, Vector2d]:
-        if not self._content:
-            return (Vector2d(0, 0), Vector2d(1, 1))
+        min_x, min_y, max_x, max_y = self.bounds_under().tolist()
+        return (Vector2d(min_x, min_y), Vector2d(max_x, max_y))
 
-        min_x = None
-        max_x = None
-        min_y = None
-        max_y = None
+    def content_bounds(self) -> numpy.ndarray:
+        """Bounds of the contents, before the transform of this shape is applied."""
+        if self._content_bounds is None:
+            self._content_bounds = self._union_bounds(None)
+        return self._content_bounds
 
-        for c in self._content:
-            min_v, max_v = c.get_bounds()
-            if min_x is None or min_x > min_v.x:
-                min_x = min_v.x
-            if min_y is None or min_y > min_v.y:
-                min_y = min_v.y
-            if max_x is None or max_x < max_v.x:
-                max_x = max_v.x
-            if max_y is None or max_y < max_v.y:
-                max_y = max_v.y
-        return (Vector2d(min_x, min_y), Vector2d(max_x, max_y))
+    def _union_bounds(self, transform: numpy.ndarray | None) -> numpy.ndarray:
+        if not self._content:
+            return _DEFAULT_BOUNDS
+        bounds = numpy.array([c.bounds_under(transform) for c in self._content])
+        return numpy.concatenate([bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)])
+
+    def bounds_under(self, transform: numpy.ndarray = None) -> numpy.ndarray:
+        if transform is None:
+            if self._bounds is None:
+                self._bounds = self._bounds_with(self._transform)
+            return self._bounds
+        return self._bounds_with(transform @ self._transform)
+
+    def _bounds_with(self, transform: numpy.ndarray) -> numpy.ndarray:
+        if not self._content:
+            return _DEFAULT_BOUNDS
+        if is_axis_aligned(transform):
+            return affine_bounds(self.content_bounds(), transform)
+        return self._union_bounds(transform)
 
     def move_to(self, x, y):
         translation = Vector2d(x, y).sub(self.center())
@@ -172,28 +307,31 @@ class Shape:
         self.scale(1.0 / w, 1.0 / h)
 
     def apply_vector_op(self, f):
-        for c in self._content:
-            c.apply_vector_op(f)
+        # An arbitrary vector operation can not be expressed as a matrix, so the contents are materialized.
+        contents = list()
+        for c, transform in self._iter_content():
+            contents.append(ShapeContent(c.transformed_points(transform), c.type).apply_vector_op(f))
+        self._content = tuple(contents)
+        self._transform = affine_identity()
+        self._content_bounds = None
+        self._bounds = None
+        self._fingerprint = None
 
     def scale(self, factor_x, factor_y=None):
         if factor_y is None:
             factor_y = factor_x
-        for c in self._content:
-            c.scale(factor_x, factor_y)
+        self._apply_transform(affine_scale(factor_x, factor_y))
 
     def translate(self, x, y):
-        for c in self._content:
-            c.translate(x, y)
+        self._apply_transform(affine_translation(x, y))
 
     def flip(self, horizontal: bool, vertical: bool, center: Vector2d = None):
         if center is None:
             center = self.center()
-        for c in self._content:
-            c.flip(horizontal, vertical, center)
+        self._apply_transform(affine_flip(horizontal, vertical, center))
 
     def rotate(self, center: Vector2d, degrees: float):
-        for c in self._content:
-            c.rotate(center, degrees)
+        self._apply_transform(affine_rotation(degrees, center))
 
     def draw_xor(self, bitcanvas: BitCanvas, fill: bool = True, line_width: float = 1,
                  viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1))):
@@ -203,14 +341,131 @@ class Shape:
                     viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1))):
         return self.draw(bitcanvas, False, fill, line_width, viewport)
 
-    def draw(self, bitcanvas: BitCanvas, draw_xor: bool = False, draw_fill: bool = True, line_width: int | float = 1,
-             viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1))):
+    def _iter_batches(self, transform: numpy.ndarray = None) -> Iterator[Tuple[ShapeContent, numpy.ndarray]]:
+        """Yields every content with its combined transform - a (K, 3, 3) stack for the contents of instanced
+        shapes, otherwise a single matrix, or None where that is the identity."""
+        combined = self._transform if transform is None else transform @ self._transform
         for c in self._content:
-            if draw_xor:
-                c.draw_xor(bitcanvas, draw_fill, line_width, viewport)
+            if isinstance(c, (Shape, ShapeInstances)):
+                yield from c._iter_batches(combined)
+            elif numpy.array_equal(combined, _IDENTITY):
+                yield c, None
             else:
-                c.draw_normal(bitcanvas, draw_fill, line_width, viewport)
+                yield c, combined
+
+    def _iter_content(self, transform: numpy.ndarray = None) -> Iterator[Tuple[ShapeContent, numpy.ndarray]]:
+        """Yields every content with its combined transform, or None where that is the identity."""
+        for c, transforms in self._iter_batches(transform):
+            if transforms is not None and transforms.ndim == 3:
+                for t in transforms:
+                    yield c, t
+            else:
+                yield c, transforms
+
+    @staticmethod
+    def _touching(content: ShapeContent, bitcanvas: BitCanvas, line_width: int | float,
+                  viewport: Tuple[Vector2d, Vector2d], transforms: numpy.ndarray) -> List[numpy.ndarray]:
+        """The transforms of a batch that can put the content on the rows of the canvas."""
+        if transforms is None or transforms.ndim == 2:
+            return [transforms]
+        instances = content.canvas_polygon(bitcanvas, viewport, transforms)
+        return list(transforms[bitcanvas.touches_rows(instances, line_width)])
+
+    @profiled("Shape.draw")
+    def draw(self, bitcanvas: BitCanvas, draw_xor: bool = False, draw_fill: bool = True, line_width: int | float = 1,
+             viewport: Tuple[Vector2d, Vector2d] = (Vector2d(0, 0), Vector2d(1, 1))):
+        if draw_xor and draw_fill:
+            # Filled polygons are XOR:ed by their combined crossing parity, in one pass over the canvas.
+            polygons = list()
+            for c, transforms in self._iter_batches():
+                if c.type != ShapeContent.TYPE_POLYGON:
+                    for t in self._touching(c, bitcanvas, line_width, viewport, transforms):
+                        c.draw_xor(bitcanvas, draw_fill, line_width, viewport, t)
+                elif transforms is not None and transforms.ndim == 3:
+                    instances = c.canvas_polygon(bitcanvas, viewport, transforms)
+                    instances = instances[bitcanvas.touches_rows(instances)]
+                    polygons.extend(bitcanvas.polygons_stamp(instances, xor=True))
+                else:
+                    polygon = c.canvas_polygon(bitcanvas, viewport, transforms)
+                    if bitcanvas.touches_rows(polygon):
+                        polygons.append(polygon)
+            bitcanvas.polygons_xor(polygons)
+            return
+        for c, transforms in self._iter_batches():
+            if transforms is not None and transforms.ndim == 3:
+                if draw_fill and not draw_xor and c.type == ShapeContent.TYPE_POLYGON:
+                    bitcanvas.set_color(BitCanvas.COLOR_WHITE)
+                    bitcanvas.set_fill(True)
+                    instances = c.canvas_polygon(bitcanvas, viewport, transforms)
+                    for p in bitcanvas.polygons_stamp(instances[bitcanvas.touches_rows(instances)]):
+                        bitcanvas.polygon(p.ravel().tolist())
+                    continue
+            for t in self._touching(c, bitcanvas, line_width, viewport, transforms):
+                if draw_xor:
+                    c.draw_xor(bitcanvas, draw_fill, line_width, viewport, t)
+                else:
+                    c.draw_normal(bitcanvas, draw_fill, line_width, viewport, t)
 
     def __str__(self):
         b = self.get_bounds()
         return f"Shape[{b[0]},{b[1]}]"
+
+
+class ShapeInstances:
+    """A prototype shape repeated under a (K, 3, 3) table of affine transforms, one per instance. It is used as a
+    content of a Shape, in place of K transformed copies of the prototype. The table is never modified."""
+
+    def __init__(self, prototype: Shape, transforms: numpy.ndarray):
+        self._prototype = prototype.copy()
+        self._transforms = numpy.asarray(transforms, dtype=numpy.float64).reshape(-1, 3, 3)
+        self._vertices = None
+        self._fingerprint = None
+
+    @property
+    def prototype(self) -> Shape:
+        return self._prototype
+
+    @property
+    def transforms(self) -> numpy.ndarray:
+        return self._transforms
+
+    def __len__(self):
+        return len(self._transforms)
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = _digest("instances;", self._transforms, parts=[self._prototype.fingerprint()])
+        return self._fingerprint
+
+    def _prototype_vertices(self) -> numpy.ndarray:
+        if self._vertices is None:
+            points = [c.transformed_points(t) for c, t in self._prototype._iter_content()]
+            self._vertices = numpy.concatenate(points) if points else numpy.zeros((0, 2))
+        return self._vertices
+
+    def bounds_under(self, transform: numpy.ndarray = None) -> numpy.ndarray:
+        if not len(self._transforms) or not len(self._prototype_vertices()):
+            return _DEFAULT_BOUNDS
+        combined = self._transforms if transform is None else transform @ self._transforms
+        aligned = is_axis_aligned(combined)
+        bounds = numpy.empty((len(combined), 4))
+        if aligned.any():
+            bounds[aligned] = affine_bounds(self._prototype.bounds_under(), combined[aligned])
+        rotated = numpy.nonzero(~aligned)[0]
+        if len(rotated):
+            vertices = self._prototype_vertices()
+            step = max(1, _CHUNK_POINTS // len(vertices))
+            for i in range(0, len(rotated), step):
+                index = rotated[i:i + step]
+                points = apply_affine(vertices, combined[index])
+                bounds[index, :2] = points.min(axis=1)
+                bounds[index, 2:] = points.max(axis=1)
+        return numpy.concatenate([bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)])
+
+    def _iter_batches(self, transform: numpy.ndarray = None) -> Iterator[Tuple[ShapeContent, numpy.ndarray]]:
+        if transform is None:
+            combined = self._transforms
+        else:
+            combined = (transform[..., None, :, :] @ self._transforms).reshape(-1, 3, 3)
+        for i in range(0, len(combined), _INSTANCE_CHUNK):
+            yield from self._prototype._iter_batches(combined[i:i + _INSTANCE_CHUNK])
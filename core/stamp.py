@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from .bitpack import packed_stride, clear_padding, shift_bits_right
+from .raster import fill_polygons_xor
+
+# Filled polygons that only differ by a translation are rasterized once, into a small packed "stamp", and then
+# blitted at every position. Polygons are keyed by their vertices truncated to whole pixels and taken relative to
+# the corner of their bounding box, which is how the scanline fill sees them, so a stamp has the same pixels as
+# filling the polygon in place. A stamp that crosses the canvas border is clipped, like the fill would be. The fill
+# rounds span ends symmetrically around zero, so polygons reaching left of the canvas are not stamped.
+
+
+class StampCache:
+    """Least recently used stamps, limited by the total number of bytes they hold."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stamps = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stamp(self, vertices: numpy.ndarray) -> numpy.ndarray:
+        """Returns the packed fill of a polygon given as (N, 2) integer vertices with a bounding box at 0, 0."""
+        key = (len(vertices), vertices.tobytes())
+        with self._lock:
+            bits = self._stamps.get(key)
+            if bits is not None:
+                self.hits += 1
+                self._stamps.move_to_end(key)
+                return bits
+            self.misses += 1
+        width, height = (vertices.max(axis=0) + 1).tolist()
+        bits = numpy.zeros((height, packed_stride(width)), dtype=numpy.uint8)
+        fill_polygons_xor(bits, width, [vertices])
+        with self._lock:
+            if key not in self._stamps:
+                self._stamps[key] = bits
+                self._bytes += bits.nbytes
+            while self._bytes > self.max_bytes and len(self._stamps) > 1:
+                _, evicted = self._stamps.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return bits
+
+    def clear(self):
+        with self._lock:
+            self._stamps.clear()
+            self._bytes = 0
+
+
+STAMP_CACHE = StampCache()
+
+# Stamping only pays off when the polygons repeat, on average, at least this many times.
+_MIN_REPEATS = 4
+
+
+def _group_geometries(relative: numpy.ndarray):
+    """Groups equal (K, N, 2) vertex arrays. Rows are matched by a hash and then compared, rows that collide with
+    a different geometry are returned as not grouped (-1)."""
+    flat = relative.reshape(len(relative), -1)
+    weights = numpy.random.default_rng(len(flat[0])).integers(1, 1 << 62, size=flat.shape[1], dtype=numpy.int64)
+    keys = (flat * weights).sum(axis=1)
+    _, first, group = numpy.unique(keys, return_index=True, return_inverse=True)
+    group = group.reshape(-1)
+    matches = numpy.all(flat == flat[first[group]], axis=1)
+    return first, numpy.where(matches, group, -1)
+
+
+def stamp_polygons(bits: numpy.ndarray, width: int, polygons: numpy.ndarray, xor: bool,
+                   cache: StampCache = STAMP_CACHE, first_row: int = 0) -> numpy.ndarray:
+    """ORs (or XORs) the fill of (K, N, 2) polygons in canvas coordinates into a packed (rows, row bytes) bitmap
+    holding the canvas rows from first_row and on, in place. Returns a mask of the polygons that were stamped, the
+    rest are left for the caller to fill. Nothing is stamped when the polygons do not repeat enough."""
+    stamped = numpy.zeros(len(polygons), dtype=bool)
+    vertices = numpy.trunc(polygons).astype(numpy.int64)
+    corners = vertices.min(axis=1)
+    candidates = numpy.nonzero(corners[:, 0] >= 0)[0]
+    if len(candidates) < _MIN_REPEATS:
+        return stamped
+    relative = vertices[candidates] - corners[candidates, None, :]
+    first, geometry = _group_geometries(relative)
+    if len(first) * _MIN_REPEATS > len(candidates):
+        return stamped
+    candidates, geometry = candidates[geometry >= 0], geometry[geometry >= 0]
+    stamped[candidates] = True
+    x, y = corners[candidates].T
+    y = y - first_row
+
+    # Every distinct geometry and bit phase gets a shifted copy of its stamp, padded to a common size.
+    variants, variant = numpy.unique(geometry * 8 + (x & 7), return_inverse=True)
+    shifted = [shift_bits_right(cache.stamp(relative[first[v >> 3]]), int(v & 7)) for v in variants.tolist()]
+    table = numpy.zeros((len(shifted), max(t.shape[0] for t in shifted), max(t.shape[1] for t in shifted)),
+                        dtype=numpy.uint8)
+    for i, t in enumerate(shifted):
+        table[i, :t.shape[0], :t.shape[1]] = t
+
+    height, stride = bits.shape
+    values = table[variant.reshape(-1)]
+    rows = y[:, None, None] + numpy.arange(table.shape[1])[:, None]
+    columns = (x >> 3)[:, None, None] + numpy.arange(table.shape[2])
+    inside = (values != 0) & (rows >= 0) & (rows < height) & (columns >= 0) & (columns < stride)
+    index = numpy.nonzero(inside)
+    op = numpy.bitwise_xor if xor else numpy.bitwise_or
+    op.at(bits, (rows[index[0], index[1], 0], columns[index[0], 0, index[2]]), values[index])
+    clear_padding(bits, width)
+    return stamped
@@ -4,7 +4,7 @@ from __future__ import division
 import math
 from functools import cache
 
-from simsimd import cosine
+import numpy
 
 
 class Vector2d:
@@ -67,6 +67,16 @@ class Vector2d:
         y2 = math.sin(radians) * self.x + math.cos(radians) * self.y
         return Vector2d(x2,y2)
 
+    def rotations(self, degrees: numpy.ndarray) -> numpy.ndarray:
+        """The vector rotated by each of an array of angles, as an (N,2) array of points."""
+        radians = (numpy.asarray(degrees, dtype=numpy.float64) / 360.0) * (math.pi * 2)
+        cos = numpy.cos(radians)
+        sin = numpy.sin(radians)
+        out = numpy.empty(radians.shape + (2,), dtype=numpy.float64)
+        out[..., 0] = cos * self.x - sin * self.y
+        out[..., 1] = sin * self.x + cos * self.y
+        return out
+
     def __repr__(self):
         return str(self)
 
@@ -74,6 +84,60 @@ class Vector2d:
         return "[{:.3f},{:.3f}]".format(self.x, self.y)
 
 
+def rotate_points(points: numpy.ndarray, degrees: float) -> numpy.ndarray:
+    """Rotates an (N,2) array of points around the origin, like Vector2d.rotate does for a single vector."""
+    radians = (degrees / 360.0) * (math.pi * 2)
+    cos = math.cos(radians)
+    sin = math.sin(radians)
+    out = numpy.empty_like(points, dtype=numpy.float64)
+    out[:, 0] = cos * points[:, 0] - sin * points[:, 1]
+    out[:, 1] = sin * points[:, 0] + cos * points[:, 1]
+    return out
+
+
+# Affine transforms are 3x3 matrices acting on column vectors (x, y, 1). The helpers that take a transform also
+# accept a stack of them, (..., 3, 3), and then return one result per transform.
+
+def affine_identity() -> numpy.ndarray:
+    return numpy.identity(3)
+
+
+def affine_translation(x: float, y: float) -> numpy.ndarray:
+    return numpy.array([[1.0, 0.0, x], [0.0, 1.0, y], [0.0, 0.0, 1.0]])
+
+
+def affine_scale(factor_x: float, factor_y: float) -> numpy.ndarray:
+    return numpy.array([[factor_x, 0.0, 0.0], [0.0, factor_y, 0.0], [0.0, 0.0, 1.0]])
+
+
+def affine_rotation(degrees: float, center: Vector2d) -> numpy.ndarray:
+    radians = (degrees / 360.0) * (math.pi * 2)
+    cos = math.cos(radians)
+    sin = math.sin(radians)
+    rotation = numpy.array([[cos, -sin, 0.0], [sin, cos, 0.0], [0.0, 0.0, 1.0]])
+    return affine_translation(center.x, center.y) @ rotation @ affine_translation(-center.x, -center.y)
+
+
+def affine_flip(horizontal: bool, vertical: bool, center: Vector2d) -> numpy.ndarray:
+    m = affine_scale(-1.0 if horizontal else 1.0, -1.0 if vertical else 1.0)
+    return affine_translation(center.x, center.y) @ m @ affine_translation(-center.x, -center.y)
+
+
+def is_axis_aligned(transform: numpy.ndarray) -> bool | numpy.ndarray:
+    return (transform[..., 0, 1] == 0) & (transform[..., 1, 0] == 0)
+
+
+def apply_affine(points: numpy.ndarray, transform: numpy.ndarray) -> numpy.ndarray:
+    return points @ numpy.swapaxes(transform[..., :2, :2], -1, -2) + transform[..., None, :2, 2]
+
+
+def affine_bounds(bounds: numpy.ndarray, transform: numpy.ndarray) -> numpy.ndarray:
+    """Bounds (min_x, min_y, max_x, max_y) of a box after an axis aligned transform."""
+    xs = bounds[..., 0::2] * transform[..., 0, 0, None] + transform[..., 0, 2, None]
+    ys = bounds[..., 1::2] * transform[..., 1, 1, None] + transform[..., 1, 2, None]
+    return numpy.stack([xs.min(axis=-1), ys.min(axis=-1), xs.max(axis=-1), ys.max(axis=-1)], axis=-1)
+
+
 def _intersect_lines(pt1, pt2, ptA, ptB):
     DET_TOLERANCE = 0.00000001
     x1, y1 = pt1
@@ -3,3 +3,39 @@ from .bitmapops import *
 from .shapenodes import *
 from .bitmaputil import *
 from .genericnodes import *
+
+# Static manifest of the node classes to register, in registration order.
+NODE_CLASSES = [
+    DPaint_BitmapCoverage,
+    DPaint_BitmapCropCenter,
+    DPaint_BitmapDistanceField,
+    DPaint_BitmapDrawShape,
+    DPaint_BitmapEdge,
+    DPaint_BitmapExpandCanvas,
+    DPaint_BitmapFilterComponents,
+    DPaint_BitmapMorphology,
+    DPaint_BitmapResize,
+    DPaint_BitmapRotate,
+    DPaint_BitmapToImage,
+    DPaint_CopyCat,
+    DPaint_Dimensions,
+    DPaint_ImageToBitmap,
+    DPaint_LabelComponents,
+    DPaint_LogicalAND,
+    DPaint_LogicalInvert,
+    DPaint_LogicalOR,
+    DPaint_LogicalXOR,
+    DPaint_NPolygon,
+    DPaint_Random,
+    DPaint_Rays,
+    DPaint_Rectangle,
+    DPaint_ShapeBounds,
+    DPaint_ShapeCenterAndFit,
+    DPaint_ShapeCombiner,
+    DPaint_ShapeFlip,
+    DPaint_ShapeGrid,
+    DPaint_ShapeResize,
+    DPaint_ShapeRotate,
+    DPaint_ShapeSweep,
+    DPaint_Star,
+]
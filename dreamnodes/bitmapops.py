@@ -1,5 +1,7 @@
 from ..conf import NodeCategories
-from ..core import BitMapImage
+from ..core import BitMapImage, cached_result
+from ..core.components import FILTER_MODES
+from ..core.morphology import ELEMENTS, EDGE_MODES
 
 
 class DPaint_LogicalInvert:
@@ -19,6 +21,7 @@ class DPaint_LogicalInvert:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage):
         return (BITMAP.invert(),)
 
@@ -41,6 +44,7 @@ class DPaint_LogicalOR:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, BITMAP2: BitMapImage):
         return (BITMAP.logical_or(BITMAP2),)
 
@@ -63,6 +67,7 @@ class DPaint_LogicalAND:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, BITMAP2: BitMapImage):
         return (BITMAP.logical_and(BITMAP2),)
 
@@ -85,6 +90,7 @@ class DPaint_LogicalXOR:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, BITMAP2: BitMapImage):
         return (BITMAP.logical_xor(BITMAP2),)
 
@@ -112,6 +118,7 @@ class DPaint_BitmapResize:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, **kwargs):
         bm = BITMAP
         current_width = bm.width
@@ -146,6 +153,7 @@ class DPaint_BitmapCropCenter:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, width_multiplier, width_pixels, height_multiplier, height_pixels):
         bm = BITMAP
         current_width = bm.width
@@ -189,6 +197,7 @@ class DPaint_BitmapExpandCanvas:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, color, border_pixels):
         bm = BITMAP
         new_width = bm.width + 2 * border_pixels
@@ -226,6 +235,7 @@ class DPaint_BitmapRotate:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, degrees, center_x, center_y, fill_color, expand):
         bm = BITMAP
         if fill_color == "black":
@@ -248,8 +258,61 @@ class DPaint_BitmapEdge:
         return {
             "required": {
                 "BITMAP": (BitMapImage.TYPE_NAME, {}),
+                "mode": (["classic"] + EDGE_MODES,),
+                "connectivity": (["8", "4"],),
             }
         }
 
-    def result(self, BITMAP: BitMapImage):
-        return (BITMAP.edge_detect(),)
\ No newline at end of file
+    @cached_result
+    def result(self, BITMAP: BitMapImage, mode: str = "classic", connectivity: str = "8"):
+        return (BITMAP.edge_detect(mode, int(connectivity)),)
+
+
+class DPaint_BitmapMorphology:
+    """Grows or shrinks the white areas of a bitmap (dilate, erode, open or close)."""
+    NODE_NAME = "Bitmap Morphology"
+    ICON = "⬚"
+    CATEGORY = NodeCategories.BITMAP_PROCESSING
+    RETURN_TYPES = (BitMapImage.TYPE_NAME,)
+    RETURN_NAMES = ("BITMAP",)
+    FUNCTION = "result"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "BITMAP": (BitMapImage.TYPE_NAME, {}),
+                "operation": (["dilate", "erode", "open", "close"],),
+                "element": (ELEMENTS,),
+                "radius": ("INT", {"min": 0, "max": 4096, "default": 1}),
+            }
+        }
+
+    @cached_result
+    def result(self, BITMAP: BitMapImage, operation: str, element: str, radius: int):
+        return (BITMAP.morphology(operation, radius, element),)
+
+
+class DPaint_BitmapFilterComponents:
+    """Removes connected components of a bitmap by size."""
+    NODE_NAME = "Bitmap Filter Components"
+    ICON = "⁘"
+    CATEGORY = NodeCategories.BITMAP_PROCESSING
+    RETURN_TYPES = (BitMapImage.TYPE_NAME,)
+    RETURN_NAMES = ("BITMAP",)
+    FUNCTION = "result"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "BITMAP": (BitMapImage.TYPE_NAME, {}),
+                "mode": (FILTER_MODES,),
+                "amount": ("INT", {"min": 0, "max": 1 << 30, "default": 16}),
+                "connectivity": (["8", "4"],),
+            }
+        }
+
+    @cached_result
+    def result(self, BITMAP: BitMapImage, mode: str, amount: int, connectivity: str):
+        return (BITMAP.filter_components(mode, amount, int(connectivity)),)
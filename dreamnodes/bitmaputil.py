@@ -1,5 +1,8 @@
+import json
+
 from ..conf import NodeCategories
-from ..core import BitMapImage
+from ..core import BitMapImage, cached_result
+from ..core.components import component_stats
 
 class DPaint_Dimensions:
     """Returns dimensions of a bitmap."""
@@ -20,3 +23,30 @@ class DPaint_Dimensions:
 
     def result(self, BITMAP: BitMapImage):
         return (BITMAP.width, BITMAP.height)
+
+
+class DPaint_LabelComponents:
+    """Labels the connected components of a bitmap."""
+    NODE_NAME = "Bitmap Label Components"
+    ICON = "🔎"
+    CATEGORY = NodeCategories.BITMAP
+    RETURN_TYPES = ("MASK", "INT", "STRING")
+    RETURN_NAMES = ("labels", "count", "components")
+    FUNCTION = "result"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "BITMAP": (BitMapImage.TYPE_NAME, {}),
+                "connectivity": (["8", "4"],),
+            }
+        }
+
+    @cached_result
+    def result(self, BITMAP: BitMapImage, connectivity: str):
+        runs = BITMAP.components(int(connectivity))
+        stats = component_stats(runs)
+        columns = {name: values.tolist() for name, values in stats.items()}
+        components = [dict(zip(columns.keys(), values)) for values in zip(*columns.values())]
+        return (BITMAP.as_tensor_labels(runs), int(runs.counts.sum()), json.dumps(components))
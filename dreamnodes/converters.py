@@ -1,14 +1,18 @@
+from typing import TYPE_CHECKING
+
 from ..core import Vector2d
 from ..conf import NodeCategories
 from ..core import BitMapImage
-from ..core import Shape, BitCanvas
-from torch import Tensor
+from ..core import Shape, BitCanvas, render_bitmap, render_bitmaps, cached_result
+
+from ..core.images import PaintColor
 
-from ..core.images import Painter_Image, PaintColor
+if TYPE_CHECKING:
+    from torch import Tensor
 
 
 class DPaint_BitmapToImage:
-    """Converts a bitmap into an RGB image and a mask."""
+    """Converts a bitmap (or a batch of bitmaps) into an RGB image and a mask."""
     NODE_NAME = "Bitmap To Image & Mask"
     ICON = "🙾"
     CATEGORY = NodeCategories.BITMAP_CONVERTERS
@@ -26,12 +30,68 @@ class DPaint_BitmapToImage:
             }
         }
 
+    @cached_result
     def result(self, BITMAP: BitMapImage, color_0_hex: str, color_1_hex: str):
         return BITMAP.as_tensor_image_and_mask(PaintColor(color_0_hex), PaintColor(color_1_hex))
 
 
+class DPaint_BitmapDistanceField:
+    """Converts a bitmap into a distance field image and mask."""
+    NODE_NAME = "Bitmap Distance Field"
+    ICON = "◎"
+    CATEGORY = NodeCategories.BITMAP_CONVERTERS
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("IMAGE", "MASK")
+    FUNCTION = "result"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "BITMAP": (BitMapImage.TYPE_NAME, {}),
+                "signed": ("BOOLEAN", {"default": False}),
+                "max_distance": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 65536.0, "step": 1.0}),
+            }
+        }
+
+    @cached_result
+    def result(self, BITMAP: BitMapImage, signed: bool, max_distance: float):
+        return BITMAP.as_tensor_distance_field(signed, max_distance)
+
+
+class DPaint_BitmapCoverage:
+    """Downscales a bitmap into an anti-aliased image and mask of pixel coverage."""
+    NODE_NAME = "Bitmap Coverage Resize"
+    ICON = "◐"
+    CATEGORY = NodeCategories.BITMAP_CONVERTERS
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("IMAGE", "MASK")
+    FUNCTION = "result"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "BITMAP": (BitMapImage.TYPE_NAME, {}),
+            },
+            "optional": {
+                "width_multiplier": ("FLOAT", {"min": 0.05, "max": 1.0, "step": 0.025}),
+                "width_pixels": ("INT", {"min": 1}),
+                "height_multiplier": ("FLOAT", {"min": 0.05, "max": 1.0, "step": 0.025}),
+                "height_pixels": ("INT", {"min": 1}),
+            }
+        }
+
+    @cached_result
+    def result(self, BITMAP: BitMapImage, **kwargs):
+        new_width = max(1, kwargs.get("width_pixels", int(round(kwargs.get("width_multiplier", 1.0) * BITMAP.width))))
+        new_height = max(1, kwargs.get("height_pixels",
+                                       int(round(kwargs.get("height_multiplier", 1.0) * BITMAP.height))))
+        return BITMAP.as_tensor_coverage(new_width, new_height)
+
+
 class DPaint_ImageToBitmap:
-    """Converts an image into a bitmap."""
+    """Converts an image or a mask (or a batch of them) into a bitmap."""
     NODE_NAME = "Image To Bitmap"
     ICON = "🙾"
     CATEGORY = NodeCategories.BITMAP_CONVERTERS
@@ -43,18 +103,22 @@ class DPaint_ImageToBitmap:
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "IMAGE": ("IMAGE", {}),
                 "threshold": ("FLOAT", {"default": 0.5, "min": 0, "max": 1.0, "step": 0.05})
+            },
+            "optional": {
+                "IMAGE": ("IMAGE", {}),
+                "MASK": ("MASK", {}),
             }
         }
 
-    def result(self, IMAGE: Tensor, threshold: float):
-        t = int(round(255 * threshold))
-        painter_images = Painter_Image.images_from_tensor_data(IMAGE)
-        if painter_images:
-            return (BitMapImage(painter_images[0].point_1(lambda p: p > t and 255, "1").pil_image),)
-        else:
+    # Not cached, fingerprinting the float input takes about as long as converting it.
+    def result(self, threshold: float, IMAGE: "Tensor" = None, MASK: "Tensor" = None):
+        tensor = IMAGE if IMAGE is not None else MASK
+        if tensor is None:
+            raise Exception("Image To Bitmap needs either an IMAGE or a MASK input!")
+        if len(tensor) == 0:
             return (BitMapImage.new_of_size(1, 1),)
+        return (BitMapImage.from_tensor(tensor, threshold),)
 
 
 class DPaint_BitmapDrawShape:
@@ -83,15 +147,83 @@ class DPaint_BitmapDrawShape:
             }
         }
 
+    @cached_result
     def result(self, SHAPE, bitmap_width, bitmap_height, shape_bound_x_min, shape_bound_y_min, shape_bound_x_max,
                shape_bound_y_max, fill: str, line_width, draw_mode):
-        canvas = BitCanvas(bitmap_width, bitmap_height)
         do_fill = fill == "yes"
         s = SHAPE.copy()
         #s.scale(new_width / current_width, new_height / current_height)
         viewport = (Vector2d(shape_bound_x_min, shape_bound_y_min), Vector2d(shape_bound_x_max, shape_bound_y_max))
-        if draw_mode == "normal":
-            s.draw_normal(canvas, do_fill, line_width, viewport=viewport)
-        elif draw_mode == "xor":
-            s.draw_xor(canvas, do_fill, line_width, viewport=viewport)
-        return (canvas.bitmap(),)
+
+        def draw(canvas: BitCanvas):
+            if draw_mode == "normal":
+                s.draw_normal(canvas, do_fill, line_width, viewport=viewport)
+            elif draw_mode == "xor":
+                s.draw_xor(canvas, do_fill, line_width, viewport=viewport)
+
+        return (render_bitmap(bitmap_width, bitmap_height, draw),)
+
+
+class DPaint_ShapeSweep:
+    """Renders a shape rotated, scaled or translated over a range of values into a batch of images and masks."""
+    NODE_NAME = "Shape Sweep Animation"
+    ICON = "🎞"
+    CATEGORY = NodeCategories.BITMAP_GENERATE
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("IMAGE", "MASK")
+    FUNCTION = "result"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "SHAPE": (Shape.TYPE_NAME,),
+                "transform": (["rotate", "scale", "translate"],),
+                "start": ("FLOAT", {"default": 0.0, "step": 0.01}),
+                "end": ("FLOAT", {"default": 360.0, "step": 0.01}),
+                "frames": ("INT", {"default": 24, "min": 1, "max": 4096}),
+                "direction_degrees": ("FLOAT", {"default": 0.0, "min": -360, "max": 360, "step": 1}),
+                "fill": (["yes", "no"],),
+                "draw_mode": (["normal", "xor"],),
+                "shape_bound_x_min": ("FLOAT", {"default": 0.0}),
+                "shape_bound_y_min": ("FLOAT", {"default": 0.0}),
+                "shape_bound_x_max": ("FLOAT", {"default": 1.0}),
+                "shape_bound_y_max": ("FLOAT", {"default": 1.0}),
+                "bitmap_width": ("INT", {"default": 512, "min": BitMapImage.MIN_SIZE_PIXELS}),
+                "bitmap_height": ("INT", {"default": 512, "min": BitMapImage.MIN_SIZE_PIXELS}),
+                "line_width": ("INT", {"default": 1}),
+                "color_0_hex": ("STRING", {"default": "000000"}),
+                "color_1_hex": ("STRING", {"default": "ffffff"}),
+            }
+        }
+
+    def _frame_shape(self, shape: Shape, transform: str, value: float, center: Vector2d, direction: Vector2d):
+        s = shape.copy()
+        if transform == "rotate":
+            s.rotate(center, value)
+        elif transform == "scale":
+            s.translate(-center.x, -center.y)
+            s.scale(value)
+            s.translate(center.x, center.y)
+        elif transform == "translate":
+            s.translate(direction.x * value, direction.y * value)
+        return s
+
+    @cached_result
+    def result(self, SHAPE, transform, start, end, frames, direction_degrees, fill, draw_mode, shape_bound_x_min,
+               shape_bound_y_min, shape_bound_x_max, shape_bound_y_max, bitmap_width, bitmap_height, line_width,
+               color_0_hex, color_1_hex):
+        do_fill = fill == "yes"
+        do_xor = draw_mode == "xor"
+        viewport = (Vector2d(shape_bound_x_min, shape_bound_y_min), Vector2d(shape_bound_x_max, shape_bound_y_max))
+        center = SHAPE.center()
+        direction = Vector2d(1.0, 0.0).rotate(direction_degrees)
+
+        # Frames only differ in the transform matrix of the shape, the vertices are shared between all of them.
+        draws = list()
+        for i in range(frames):
+            value = start if frames == 1 else start + (end - start) * (i / (frames - 1))
+            s = self._frame_shape(SHAPE, transform, value, center, direction)
+            draws.append(lambda canvas, s=s: s.draw(canvas, do_xor, do_fill, line_width, viewport))
+        bitmaps = render_bitmaps(bitmap_width, bitmap_height, draws)
+        return bitmaps.as_tensor_image_and_mask(PaintColor(color_0_hex), PaintColor(color_1_hex))
@@ -1,8 +1,13 @@
 import math
 
+import numpy
+
 from ..core import Vector2d
 from ..conf import NodeCategories
-from ..core import Shape, ShapeContent
+from ..core import Shape, ShapeContent, ShapeInstances
+
+# Upper limit for the edge, point and ray counts of the generated shapes.
+MAX_VERTEX_COUNT = 10000000
 
 
 class DPaint_NPolygon:
@@ -22,19 +27,15 @@ class DPaint_NPolygon:
                 "shape_height": ("FLOAT", {"default": 0.75, "step": 0.01}),
                 "center_x": ("FLOAT", {"default": 0.5, "step": 0.01}),
                 "center_y": ("FLOAT", {"default": 0.5, "step": 0.01}),
-                "edges": ("INT", {"min": 3, "max": 1000, "default": 12}),
+                "edges": ("INT", {"min": 3, "max": MAX_VERTEX_COUNT, "default": 12}),
             }
         }
 
     def result(self, shape_width, shape_height, center_x, center_y, edges):
-        c = Vector2d(center_x, center_y)
-        vectors = list()
-        for i in range(edges):
-            r = i / edges
-            x = shape_width * 0.5 * math.sin(r * 2 * math.pi)
-            y = shape_height * 0.5 * math.cos(r * 2 * math.pi)
-            v = Vector2d(x, y)
-            vectors.append(c.add(v))
+        angles = (numpy.arange(edges) / edges) * 2 * math.pi
+        vectors = numpy.empty((edges, 2), dtype=numpy.float64)
+        vectors[:, 0] = center_x + shape_width * 0.5 * numpy.sin(angles)
+        vectors[:, 1] = center_y + shape_height * 0.5 * numpy.cos(angles)
         return (Shape([ShapeContent(vectors, ShapeContent.TYPE_POLYGON)]),)
 
 
@@ -81,7 +82,7 @@ class DPaint_Star:
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "size": ("INT", {"default": 5, "min": 3, "max": 100}),
+                "size": ("INT", {"default": 5, "min": 3, "max": MAX_VERTEX_COUNT}),
                 "outer_diameter": ("FLOAT", {"default": 0.75, "step": 0.01, "min": 0.01}),
                 "inner_diameter": ("FLOAT", {"default": 0.35, "step": 0.01, "min": 0.01}),
                 "center_x": ("FLOAT", {"default": 0.5, "step": 0.01}),
@@ -90,16 +91,13 @@ class DPaint_Star:
         }
 
     def result(self, size, outer_diameter, inner_diameter, center_x, center_y):
-        vectors = list()
-        c = Vector2d(center_x, center_y)
         step = 360.0 / (size * 2)
-        vi = Vector2d(0, inner_diameter * 0.5)
-        vo = Vector2d(0, outer_diameter * 0.5)
-        for i in range(size + size):
-            if i % 2 == 0:
-                vectors.append(c.add(vi.rotate(step * i)))
-            else:
-                vectors.append(c.add(vo.rotate(step * i)))
+        angles = step * numpy.arange(size + size).reshape(size, 2)
+        # Points alternate between the inner and the outer circle.
+        vectors = numpy.empty((size, 2, 2), dtype=numpy.float64)
+        vectors[:, 0] = Vector2d(0, inner_diameter * 0.5).rotations(angles[:, 0])
+        vectors[:, 1] = Vector2d(0, outer_diameter * 0.5).rotations(angles[:, 1])
+        vectors = vectors.reshape(-1, 2) + (center_x, center_y)
         return (Shape([ShapeContent(vectors, ShapeContent.TYPE_POLYGON)]),)
 
 
@@ -119,8 +117,8 @@ class DPaint_ShapeGrid:
                 "SHAPE": (Shape.TYPE_NAME,),
                 "width": ("FLOAT", {"default": 0.75, "step": 0.01}),
                 "height": ("FLOAT", {"default": 0.75, "step": 0.01}),
-                "columns": ("INT", {"default": 10, "min": 1, "max": 256}),
-                "rows": ("INT", {"default": 10, "min": 1, "max": 256}),
+                "columns": ("INT", {"default": 10, "min": 1, "max": 1024}),
+                "rows": ("INT", {"default": 10, "min": 1, "max": 1024}),
                 "inbetween_skip": ("INT", {"default": 0, "min": 0, "max": 256}),
                 "row_skip_offset": ("INT", {"default": 0, "min": 0, "max": 256}),
             }
@@ -138,19 +136,19 @@ class DPaint_ShapeGrid:
         step_y = height / rows
         center = Vector2d(0.5, 0.5)
 
-        sub_shapes = list()
-        counter = 0
-        for row in range(rows):
-            for column in range(columns):
-                counter += 1
-                if (counter + (row_skip_offset * row)) % (inbetween_skip + 1) == 0:
-                    c = scaled_grid_shape.copy()
-                    pos = Vector2d(start_x + column * step_x, start_y + row * step_y)
-                    translation = pos.sub(center)
-                    c.translate(translation.x, translation.y)
-                    sub_shapes.append(c)
-
-        s = Shape(sub_shapes)
+        row, column = numpy.divmod(numpy.arange(rows * columns), columns)
+        counter = numpy.arange(1, rows * columns + 1)
+        selected = (counter + (row_skip_offset * row)) % (inbetween_skip + 1) == 0
+        row, column = row[selected], column[selected]
+
+        translations = numpy.repeat(numpy.identity(3)[None], len(row), axis=0)
+        translations[:, 0, 2] = (start_x + column * step_x) - center.x
+        translations[:, 1, 2] = (start_y + row * step_y) - center.y
+
+        if len(translations):
+            s = Shape([ShapeInstances(scaled_grid_shape, translations)])
+        else:
+            s = Shape([])
         s.normalize()
         s.scale(width, height)
         s.translate((1 - width) * 0.5, (1 - height) * 0.5)
@@ -297,22 +295,20 @@ class DPaint_Rays:
                 "center_x": ("FLOAT", {"default": 0.5, "step": 0.01, "min": -3, "max": 3}),
                 "center_y": ("FLOAT", {"default": 0.5, "step": 0.01, "min": -3, "max": 3}),
                 "diameter": ("FLOAT", {"default": 2.0, "step": 0.01}),
-                "rays": ("INT", {"min": 2, "max": 1000, "default": 12}),
+                "rays": ("INT", {"min": 2, "max": MAX_VERTEX_COUNT, "default": 12}),
             }
         }
 
     def result(self, ray_origin_x, ray_origin_y, center_x, center_y, rays, diameter):
-        c = Vector2d(center_x, center_y)
-        o = Vector2d(ray_origin_x, ray_origin_y)
         step = 360.0 / rays
+        angles = step * numpy.arange(rays)
         v = Vector2d(0, diameter * 0.5)
-        vectors = list()
-        for i in range(rays):
-            v_rotated = v.rotate(step * i)
-            vectors.append(o)
-            vectors.append(c.add(v_rotated))
-            v_rotated = v.rotate(step * i + step * 0.5)
-            vectors.append(c.add(v_rotated))
+        # Every ray is a triangle from the origin out to two points on the circle.
+        vectors = numpy.empty((rays, 3, 2), dtype=numpy.float64)
+        vectors[:, 0] = (ray_origin_x, ray_origin_y)
+        vectors[:, 1] = v.rotations(angles) + (center_x, center_y)
+        vectors[:, 2] = v.rotations(angles + step * 0.5) + (center_x, center_y)
+        vectors = vectors.reshape(-1, 2)
 
         return (Shape([ShapeContent(vectors, ShapeContent.TYPE_POLYGON)]),)
 
@@ -343,9 +339,9 @@ class DPaint_CopyCat:
 
     def result(self, SHAPE, copies, copy_translation_x, copy_translation_y, copy_rotation_degrees, copy_scale_factor,
                apply_scale_to_translation, apply_rotation_to_translation):
-        shapes = list()
-        shapes.append(SHAPE)
-        previous = SHAPE
+        # Every copy is the input shape under its own transform, collected into an instance table.
+        previous = Shape([SHAPE])
+        transforms = [previous.transform]
         for i in range(1, copies + 1):
             s = previous.copy()
             t = Vector2d(copy_translation_x, copy_translation_y)
@@ -359,10 +355,10 @@ class DPaint_CopyCat:
             s.rotate(c, copy_rotation_degrees)
             s.scale(copy_scale_factor)
             s.move_to(new_position.x, new_position.y)
-            shapes.append(s)
+            transforms.append(s.transform)
             previous = s
 
-        return (Shape(shapes),)
+        return (Shape([ShapeInstances(SHAPE, numpy.array(transforms))]),)
 
 
 class DPaint_ShapeBounds:
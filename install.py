@@ -1,14 +1,29 @@
 # -*- coding: utf-8 -*-
+import importlib.util
+import os
+import sys
 
 from conf import DPaint_Config
 
 
 def setup_default_config():
-    DPaint_Config()
-    pass
+    DPaint_Config().save()
+
+
+def update_node_index():
+    # The package is imported under a fixed name, as the directory name is not a valid module name.
+    directory = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location("dpaint_install", os.path.join(directory, "__init__.py"),
+                                                  submodule_search_locations=[directory])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = package
+    spec.loader.exec_module(package)
+    package.write_node_index()
+
 
 def run_install():
     setup_default_config()
+    update_node_index()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PACKAGE = "dpaint_tests"
+
+# The core package only uses relative imports among its own modules and can be imported from the repository root.
+sys.path.insert(0, _ROOT)
+
+
+@pytest.fixture(scope="session")
+def nodes():
+    """The node classes, with the repository loaded as a package without running its ComfyUI registration."""
+    if _PACKAGE not in sys.modules:
+        package = types.ModuleType(_PACKAGE)
+        package.__path__ = [_ROOT]
+        sys.modules[_PACKAGE] = package
+    return importlib.import_module(_PACKAGE + ".dreamnodes")
+
+
+@pytest.fixture(scope="session")
+def node_core(nodes):
+    """The core package the node classes use."""
+    return importlib.import_module(_PACKAGE + ".core")
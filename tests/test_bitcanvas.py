@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+
+from core import BitCanvas
+
+
+def _random_polygon(rng, width, height):
+    return rng.uniform(-0.3, 1.3, (rng.randint(2, 9), 2)) * (width, height)
+
+
+@pytest.mark.parametrize("line_width", [1, 2, 5])
+def test_band_xor_matches_full_canvas(line_width):
+    rng = numpy.random.RandomState(line_width)
+    for _ in range(40):
+        width, height = rng.randint(4, 120), rng.randint(4, 120)
+        rows = (0, height) if rng.rand() < 0.5 else tuple(sorted(rng.randint(0, height + 1, 2)))
+        canvas, expected = BitCanvas(width, height, rows), BitCanvas(width, height, rows)
+        for _ in range(rng.randint(1, 6)):
+            points = _random_polygon(rng, width, height)
+            closed = numpy.concatenate([points, points[:1]]).ravel().tolist()
+            band = canvas.band_copy(points, line_width)
+            if band is not None:
+                band.polyline(closed, line_width)
+                canvas.combine_xor_band(band)
+            full = expected.clear_copy()
+            full.polyline(closed, line_width)
+            expected.combine_xor(full)
+        numpy.testing.assert_array_equal(canvas.packed_bits(), expected.packed_bits())
+
+
+def test_polygons_xor_matches_full_canvas():
+    rng = numpy.random.RandomState(0)
+    for _ in range(40):
+        width, height = rng.randint(4, 120), rng.randint(4, 120)
+        polygons = [_random_polygon(rng, width, height) for _ in range(rng.randint(1, 4))]
+        canvas, expected = BitCanvas(width, height), BitCanvas(width, height)
+        canvas.polygons_xor(polygons)
+        for polygon in polygons:
+            full = expected.clear_copy()
+            full.polygon(polygon.ravel().tolist())
+            expected.combine_xor(full)
+        numpy.testing.assert_array_equal(canvas.packed_bits(), expected.packed_bits())
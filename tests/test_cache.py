@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import numpy
+
+from core.cache import ResultCache, RESULT_CACHE, cached_result
+
+
+def test_put_skips_results_above_fraction_of_limit():
+    cache = ResultCache(max_bytes=4000)
+    cache.put("small", numpy.zeros(900, dtype=numpy.uint8))
+    cache.put("large", numpy.zeros(1100, dtype=numpy.uint8))
+    assert cache.get("small")[0]
+    assert not cache.get("large")[0]
+
+
+def test_cached_result_stores_only_results_that_fit(monkeypatch):
+    monkeypatch.setattr(RESULT_CACHE, "max_bytes", 4000)
+    RESULT_CACHE.clear()
+    calls = []
+
+    class Node:
+        @cached_result
+        def result(self, size):
+            calls.append(size)
+            return numpy.zeros(size, dtype=numpy.uint8)
+
+    node = Node()
+    for size in (10, 10, 2000, 2000, 10, 10):
+        assert len(node.result(size)) == size
+    # Neither the second large run nor the small run after it are looked up, the last run finds the first result.
+    assert calls == [10, 2000, 2000, 10]
+    RESULT_CACHE.clear()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import json
+from collections import deque
+
+import numpy
+import pytest
+
+from core.bitpack import pack_bits, unpack_bits
+from core.components import label_runs, label_map, component_stats, filter_components, FILTER_REMOVE_SMALLER, \
+    FILTER_REMOVE_LARGER, FILTER_KEEP_LARGEST
+
+
+def reference_labels(frame, connectivity):
+    """Labels by flood fill from every unlabeled white pixel in raster order, with the area and bounding box of
+    every component."""
+    height, width = frame.shape
+    labels = numpy.zeros(frame.shape, dtype=numpy.int64)
+    steps = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    if connectivity == 8:
+        steps += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+    components = []
+    for y, x in zip(*numpy.nonzero(frame)):
+        if labels[y, x]:
+            continue
+        label = len(components) + 1
+        labels[y, x] = label
+        pixels = []
+        queue = deque([(y, x)])
+        while queue:
+            cy, cx = queue.popleft()
+            pixels.append((cy, cx))
+            for dy, dx in steps:
+                ny, nx = cy + dy, cx + dx
+                if 0 <= ny < height and 0 <= nx < width and frame[ny, nx] and not labels[ny, nx]:
+                    labels[ny, nx] = label
+                    queue.append((ny, nx))
+        ys, xs = numpy.array(pixels).T
+        components.append({"label": label, "area": len(pixels), "x": int(xs.min()), "y": int(ys.min()),
+                           "width": int(xs.max() - xs.min() + 1), "height": int(ys.max() - ys.min() + 1)})
+    return labels, components
+
+
+def _random_frames(rng):
+    width, height = rng.randint(1, 50), rng.randint(1, 50)
+    return rng.rand(rng.randint(1, 4), height, width) < rng.choice([0.1, 0.4, 0.6, 0.9])
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+def test_labels_and_stats_match_flood_fill(connectivity):
+    rng = numpy.random.RandomState(connectivity)
+    for _ in range(40):
+        pixels = _random_frames(rng)
+        width = pixels.shape[-1]
+        bits = pack_bits(pixels)
+        runs = label_runs(bits, width, connectivity)
+        labels = label_map(bits, width, runs)
+        stats = component_stats(runs)
+        expected = []
+        for i, frame in enumerate(pixels):
+            frame_labels, components = reference_labels(frame, connectivity)
+            numpy.testing.assert_array_equal(labels[i], frame_labels)
+            assert runs.counts[i] == len(components)
+            expected += [dict(c, frame=i) for c in components]
+        columns = {name: values.tolist() for name, values in stats.items()}
+        assert [dict(zip(columns.keys(), values)) for values in zip(*columns.values())] == expected
+
+
+@pytest.mark.parametrize("connectivity", ["4", "8"])
+def test_label_components_node(nodes, node_core, connectivity):
+    rng = numpy.random.RandomState(int(connectivity))
+    for _ in range(10):
+        pixels = _random_frames(rng)
+        bitmap = node_core.BitMapImage.from_packed(pack_bits(pixels), pixels.shape[-1])
+        pixels = unpack_bits(bitmap.packed_bits, bitmap.width).astype(bool)
+        labels, count, components = nodes.DPaint_LabelComponents().result(bitmap, connectivity)
+        expected_labels, expected = [], []
+        for i, frame in enumerate(pixels):
+            frame_labels, frame_components = reference_labels(frame, int(connectivity))
+            expected_labels.append(frame_labels)
+            expected += [dict(c, frame=i) for c in frame_components]
+        numpy.testing.assert_array_equal(labels.numpy(), numpy.array(expected_labels, dtype=numpy.float32))
+        assert count == len(expected)
+        assert json.loads(components) == expected
+
+
+def reference_filter(frame, mode, amount, connectivity):
+    labels, components = reference_labels(frame, connectivity)
+    area = numpy.array([0] + [c["area"] for c in components])
+    if mode == FILTER_REMOVE_SMALLER:
+        keep = area >= amount
+    elif mode == FILTER_REMOVE_LARGER:
+        keep = area <= amount
+    else:
+        # Largest first, ties in label order.
+        order = sorted(range(1, len(area)), key=lambda label: (-area[label], label))
+        keep = numpy.zeros(len(area), dtype=bool)
+        keep[order[:amount]] = True
+    keep[0] = False
+    return keep[labels]
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("mode", [FILTER_REMOVE_SMALLER, FILTER_REMOVE_LARGER, FILTER_KEEP_LARGEST])
+def test_filter_components_matches_flood_fill(mode, connectivity):
+    rng = numpy.random.RandomState(len(mode) + connectivity)
+    for _ in range(30):
+        pixels = _random_frames(rng)
+        width = pixels.shape[-1]
+        amount = int(rng.choice([0, 1, 2, 3, 5, 20]))
+        result = unpack_bits(filter_components(pack_bits(pixels), width, mode, amount, connectivity), width)
+        for i, frame in enumerate(pixels):
+            numpy.testing.assert_array_equal(result[i].astype(bool), reference_filter(frame, mode, amount, connectivity))
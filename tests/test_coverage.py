@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+
+from core.bitpack import pack_bits
+from core.coverage import coverage
+
+
+def _overlaps(size, new_size):
+    """How much of every pixel, (new_size, size), each box of the new size covers."""
+    edges = numpy.arange(new_size + 1) * (size / new_size)
+    pixels = numpy.arange(size)
+    return numpy.clip(numpy.minimum(edges[1:, None], pixels + 1) - numpy.maximum(edges[:-1, None], pixels), 0, None)
+
+
+def reference_coverage(pixels, new_width, new_height):
+    """The average of every box, weighting each pixel by the part of it inside the box."""
+    height, width = pixels.shape[-2:]
+    area = (width / new_width) * (height / new_height)
+    return _overlaps(height, new_height) @ pixels.astype(numpy.float64) @ _overlaps(width, new_width).T / area
+
+
+@pytest.mark.parametrize("width,height,new_width,new_height", [
+    (64, 32, 4, 4), (64, 48, 8, 6), (48, 16, 12, 8), (40, 20, 20, 10), (40, 24, 10, 6), (30, 27, 10, 9),
+    (37, 29, 1, 1), (37, 29, 5, 7), (100, 3, 7, 2), (17, 23, 16, 22),
+    (9, 5, 27, 10), (8, 8, 24, 12), (13, 7, 40, 50), (20, 20, 20, 20), (16, 8, 16, 8)])
+def test_coverage_matches_box_average(width, height, new_width, new_height):
+    rng = numpy.random.RandomState(width * height)
+    pixels = rng.rand(3, height, width) < rng.choice([0.1, 0.5, 0.9])
+    out = coverage(pack_bits(pixels), width, new_width, new_height)
+    assert out.dtype == numpy.float32 and out.shape == (3, new_height, new_width)
+    numpy.testing.assert_allclose(out, reference_coverage(pixels, new_width, new_height), atol=1e-5)
+
+
+def test_coverage_random_sizes():
+    rng = numpy.random.RandomState(0)
+    for _ in range(50):
+        width, height = rng.randint(1, 70), rng.randint(1, 70)
+        new_width, new_height = rng.randint(1, 2 * width + 1), rng.randint(1, 2 * height + 1)
+        pixels = rng.rand(1, height, width) < 0.5
+        numpy.testing.assert_allclose(coverage(pack_bits(pixels), width, new_width, new_height),
+                                      reference_coverage(pixels, new_width, new_height), atol=1e-5)
+
+
+def test_coverage_rejects_empty_size():
+    with pytest.raises(Exception):
+        coverage(pack_bits(numpy.ones((1, 4, 4), dtype=bool)), 4, 0, 2)
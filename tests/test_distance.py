@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+
+from core.bitpack import pack_bits
+from core.distance import distance_field, squared_distances
+
+
+def _brute_squared(sites):
+    """Squared distance from every pixel of a boolean frame to its nearest site, by trying every site."""
+    ys, xs = numpy.nonzero(sites)
+    if not len(ys):
+        return numpy.full(sites.shape, numpy.inf)
+    gy, gx = numpy.indices(sites.shape)
+    return ((gy[..., None] - ys) ** 2 + (gx[..., None] - xs) ** 2).min(axis=-1).astype(numpy.float64)
+
+
+def reference_field(pixels, signed):
+    diagonal = numpy.hypot(pixels.shape[-2], pixels.shape[-1])
+    out = numpy.empty(pixels.shape, dtype=numpy.float64)
+    for i, frame in enumerate(pixels):
+        field = numpy.sqrt(_brute_squared(frame))
+        if signed:
+            field[frame] = -numpy.sqrt(_brute_squared(~frame))[frame]
+        out[i] = numpy.clip(field, -diagonal, diagonal)
+    return out
+
+
+@pytest.mark.parametrize("signed", [False, True])
+def test_distance_field_matches_brute_force(signed):
+    rng = numpy.random.RandomState(int(signed))
+    for _ in range(30):
+        width, height = rng.randint(1, 40), rng.randint(1, 40)
+        pixels = rng.rand(2, height, width) < rng.choice([0.01, 0.1, 0.5, 0.9])
+        field = distance_field(pack_bits(pixels), width, signed)
+        assert field.dtype == numpy.float32
+        numpy.testing.assert_allclose(field, reference_field(pixels, signed), rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("signed", [False, True])
+def test_distance_field_blank_frames(signed):
+    pixels = numpy.zeros((2, 12, 17), dtype=bool)
+    pixels[1] = True
+    numpy.testing.assert_allclose(distance_field(pack_bits(pixels), 17, signed), reference_field(pixels, signed),
+                                  rtol=1e-6)
+
+
+def test_squared_distances_border_is_site():
+    rng = numpy.random.RandomState(3)
+    for _ in range(20):
+        width, height = rng.randint(1, 30), rng.randint(1, 30)
+        sites = rng.rand(height, width) < 0.05
+        padded = numpy.ones((height + 2, width + 2), dtype=bool)
+        padded[1:-1, 1:-1] = sites
+        numpy.testing.assert_array_equal(squared_distances(sites, border_is_site=True),
+                                         _brute_squared(padded)[1:-1, 1:-1])
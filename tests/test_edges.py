@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+from PIL import ImageFilter
+
+from core import BitMapImage
+from core.bitpack import pack_bits, unpack_bits, packed_to_pil, pil_to_packed
+from core.morphology import edges, EDGE_INNER, EDGE_OUTER, EDGE_BOTH
+
+
+def reference_edges(frame, mode, connectivity):
+    """Per pixel: inner edges are white pixels with a black neighbour, pixels outside the frame counting as black,
+    outer edges are black pixels with a white neighbour."""
+    height, width = frame.shape
+    steps = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    if connectivity == 8:
+        steps += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+    out = numpy.zeros(frame.shape, dtype=bool)
+    for y in range(height):
+        for x in range(width):
+            neighbours = [frame[y + dy, x + dx] if 0 <= y + dy < height and 0 <= x + dx < width else False
+                          for dy, dx in steps]
+            inner = frame[y, x] and not all(neighbours)
+            outer = not frame[y, x] and any(neighbours)
+            out[y, x] = {EDGE_INNER: inner, EDGE_OUTER: outer, EDGE_BOTH: inner or outer}[mode]
+    return out
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("mode", [EDGE_INNER, EDGE_OUTER, EDGE_BOTH])
+def test_edges_match_neighbourhood(mode, connectivity):
+    rng = numpy.random.RandomState(len(mode) + connectivity)
+    for _ in range(20):
+        width, height = rng.randint(1, 30), rng.randint(1, 30)
+        pixels = rng.rand(2, height, width) < rng.choice([0.1, 0.5, 0.9])
+        result = unpack_bits(edges(pack_bits(pixels), width, mode, connectivity), width).astype(bool)
+        for i, frame in enumerate(pixels):
+            numpy.testing.assert_array_equal(result[i], reference_edges(frame, mode, connectivity))
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("mode", [EDGE_INNER, EDGE_OUTER, EDGE_BOTH])
+def test_edge_detect_modes(mode, connectivity):
+    pixels = numpy.random.RandomState(5).rand(3, 24, 37) < 0.5
+    bitmap = BitMapImage.from_packed(pack_bits(pixels), 37).edge_detect(mode, connectivity)
+    result = unpack_bits(bitmap.packed_bits, 37).astype(bool)
+    for i, frame in enumerate(pixels):
+        numpy.testing.assert_array_equal(result[i], reference_edges(frame, mode, connectivity))
+
+
+def test_edge_detect_classic_is_pil_find_edges():
+    rng = numpy.random.RandomState(0)
+    for width, height in ((37, 24), (64, 64), (5, 9)):
+        bits = pack_bits(rng.rand(2, height, width) < 0.5)
+        result = BitMapImage.from_packed(bits, width).edge_detect()
+        for i in range(2):
+            expected = packed_to_pil(bits[i], width).filter(ImageFilter.FIND_EDGES).convert("1")
+            numpy.testing.assert_array_equal(result.packed_bits[i], pil_to_packed(expected))
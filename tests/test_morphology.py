@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+
+from core.bitpack import pack_bits, unpack_bits
+from core.morphology import morphology, _disc_by_distance, ELEMENT_SQUARE, ELEMENT_CROSS, ELEMENT_DISC
+
+
+def _offsets(element, radius):
+    span = range(-radius, radius + 1)
+    if element == ELEMENT_SQUARE:
+        return [(dx, dy) for dy in span for dx in span]
+    if element == ELEMENT_CROSS:
+        return [(dx, 0) for dx in span] + [(0, dy) for dy in span if dy]
+    return [(dx, dy) for dy in span for dx in span if dx * dx + dy * dy <= radius * radius]
+
+
+def _shifted(pixels, dx, dy):
+    """pixels[y + dy, x + dx] for every pixel, background outside the frame."""
+    height, width = pixels.shape[-2:]
+    out = numpy.zeros_like(pixels)
+    if abs(dx) >= width or abs(dy) >= height:
+        return out
+    out[..., max(0, -dy):min(height, height - dy), max(0, -dx):min(width, width - dx)] = \
+        pixels[..., max(0, dy):min(height, height + dy), max(0, dx):min(width, width + dx)]
+    return out
+
+
+def reference_morphology(pixels, operation, radius, element):
+    """Brute force morphology of boolean frames, one shifted copy per offset of the element."""
+    if operation == "open":
+        return reference_morphology(reference_morphology(pixels, "erode", radius, element), "dilate", radius, element)
+    if operation == "close":
+        return reference_morphology(reference_morphology(pixels, "dilate", radius, element), "erode", radius, element)
+    shifts = [_shifted(pixels, dx, dy) for dx, dy in _offsets(element, radius)]
+    return numpy.logical_or.reduce(shifts) if operation == "dilate" else numpy.logical_and.reduce(shifts)
+
+
+@pytest.mark.parametrize("element", [ELEMENT_SQUARE, ELEMENT_CROSS, ELEMENT_DISC])
+@pytest.mark.parametrize("operation", ["dilate", "erode", "open", "close"])
+def test_morphology_matches_reference(element, operation):
+    rng = numpy.random.RandomState(len(element) * 7 + len(operation))
+    for radius in (0, 1, 2, 3, 6, 11):
+        for width, height, density in ((37, 29, 0.03), (64, 48, 0.5), (23, 71, 0.95), (9, 13, 0.3)):
+            pixels = rng.rand(2, height, width) < density
+            result = unpack_bits(morphology(pack_bits(pixels), width, operation, radius, element), width)
+            numpy.testing.assert_array_equal(result.astype(bool),
+                                             reference_morphology(pixels, operation, radius, element))
+
+
+@pytest.mark.parametrize("radius", [1, 2, 3, 5, 8, 13, 21])
+@pytest.mark.parametrize("operation", ["dilate", "erode"])
+def test_disc_by_distance_matches_reference(radius, operation):
+    rng = numpy.random.RandomState(radius)
+    for width, height, density in ((37, 29, 0.02), (64, 48, 0.5), (23, 71, 0.97)):
+        pixels = rng.rand(2, height, width) < density
+        result = unpack_bits(_disc_by_distance(pack_bits(pixels), width, operation, radius), width)
+        numpy.testing.assert_array_equal(result.astype(bool),
+                                         reference_morphology(pixels, operation, radius, ELEMENT_DISC))
+
+
+@pytest.mark.parametrize("operation", ["dilate", "erode"])
+def test_disc_by_distance_blank_frames(operation):
+    for value in (False, True):
+        pixels = numpy.full((1, 20, 30), value)
+        result = unpack_bits(_disc_by_distance(pack_bits(pixels), 30, operation, 4), 30)
+        numpy.testing.assert_array_equal(result.astype(bool), reference_morphology(pixels, operation, 4, ELEMENT_DISC))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+
+from core import raster
+from core.bitpack import pil_to_packed
+
+
+def _pil_xor(polygons, width, height):
+    """The polygons filled one at a time with PIL, outline included, and XOR:ed together."""
+    image = Image.new("1", (width, height))
+    for polygon in polygons:
+        single = Image.new("1", (width, height))
+        ImageDraw.Draw(single).polygon(polygon.ravel().tolist(), fill=1, outline=1)
+        image = ImageChops.logical_xor(image, single)
+    return pil_to_packed(image)
+
+
+def _random_polygons(rng, width, height):
+    polygons = []
+    for _ in range(rng.randint(1, 6)):
+        count = rng.randint(2, 12)
+        points = rng.uniform(-0.2, 1.2, (count, 2)) * (width, height)
+        if rng.rand() < 0.3:
+            points = numpy.round(points)
+        if rng.rand() < 0.2 and count > 2:
+            points[1, 1] = points[0, 1]
+        polygons.append(points)
+    return polygons
+
+
+@pytest.mark.parametrize("chunk_crossings", [7, 50, 1 << 18])
+def test_fill_polygons_xor_matches_pil(monkeypatch, chunk_crossings):
+    monkeypatch.setattr(raster, "_CHUNK_CROSSINGS", chunk_crossings)
+    rng = numpy.random.RandomState(chunk_crossings)
+    for _ in range(60):
+        width, height = rng.randint(1, 80), rng.randint(1, 80)
+        polygons = _random_polygons(rng, width, height)
+        expected = _pil_xor(polygons, width, height)
+        first_row = rng.randint(0, height)
+        stop_row = rng.randint(first_row, height + 1)
+        bits = numpy.zeros((stop_row - first_row, expected.shape[-1]), dtype=numpy.uint8)
+        raster.fill_polygons_xor(bits, width, polygons, first_row, height)
+        numpy.testing.assert_array_equal(bits, expected[first_row:stop_row])
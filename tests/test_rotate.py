@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy
+import pytest
+from PIL import Image
+
+from core.bitpack import pack_bits, packed_to_pil, pil_to_packed
+from core.rotate import rotate_bits
+
+
+@pytest.mark.parametrize("expand", [False, True])
+def test_rotate_bits_matches_pil(expand):
+    rng = numpy.random.RandomState(int(expand))
+    for _ in range(300):
+        width, height = rng.randint(1, 40), rng.randint(1, 40)
+        bits = pack_bits(rng.rand(2, height, width) < 0.5)
+        degrees = int(rng.randint(-8, 9)) * 90 + float(rng.choice([0, 0, 0, 360 * 2 ** -20]))
+        center_x, center_y = [(width / 2, height / 2), tuple(rng.uniform(-30, 70, 2)),
+                              (int(rng.randint(0, width + 1)), int(rng.randint(0, height + 1)))][rng.randint(3)]
+        fill = int(rng.randint(2))
+        rotated = rotate_bits(bits, width, center_x, center_y, degrees, expand, fill)
+        for frame in range(2):
+            expected = packed_to_pil(bits[frame], width).rotate(degrees, resample=Image.NEAREST, expand=expand,
+                                                                center=(center_x, center_y), fillcolor=(fill,))
+            if rotated is None:
+                assert degrees % 90
+                continue
+            assert rotated[1] == expected.width
+            numpy.testing.assert_array_equal(rotated[0][frame], pil_to_packed(expected))
+
+
+def test_rotate_bits_leaves_other_angles_to_pil():
+    bits = pack_bits(numpy.ones((1, 8, 8), dtype=bool))
+    for degrees in (1, 45, 89.5, 135, -30):
+        assert rotate_bits(bits, 8, 4, 4, degrees) is None